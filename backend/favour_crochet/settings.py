@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
 import dj_database_url
@@ -21,6 +22,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.humanize",
     "rest_framework",
     "corsheaders",
     "django_filters",
@@ -28,6 +30,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Removes itself unless REQUEST_INSTRUMENTATION is enabled
+    "products.instrumentation.RequestInstrumentationMiddleware",
+    # Removes itself unless METRICS_ENABLED is set
+    "products.metrics.MetricsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.middleware.security.SecurityMiddleware",
@@ -66,6 +72,94 @@ DATABASES = {
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Cache: per-process local memory by default. "file" and "db" share one cache
+# between gunicorn workers without external services ("db" needs
+# `python manage.py createcachetable`).
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "locmem")
+if CACHE_BACKEND == "file":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv("CACHE_LOCATION", str(BASE_DIR / "cache")),
+        }
+    }
+elif CACHE_BACKEND == "db":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": os.getenv("CACHE_LOCATION", "django_cache"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Seconds a cached public catalog response may be served
+CATALOG_CACHE_TIMEOUT = int(os.getenv("CATALOG_CACHE_TIMEOUT", "300"))
+
+# Product search: "auto" picks PostgreSQL full-text or SQLite FTS5 from the
+# database vendor; "icontains" forces the plain SearchFilter lookups.
+PRODUCT_SEARCH_BACKEND = os.getenv("PRODUCT_SEARCH_BACKEND", "auto")
+
+# Per-request timing: a Server-Timing header plus one JSON log line per
+# request, and a warning when one SQL statement runs at least
+# DUPLICATE_QUERY_THRESHOLD times in a request (likely N+1).
+REQUEST_INSTRUMENTATION = os.getenv("REQUEST_INSTRUMENTATION", "False").lower() == "true"
+DUPLICATE_QUERY_THRESHOLD = int(os.getenv("DUPLICATE_QUERY_THRESHOLD", "5"))
+
+# Prometheus-style metrics at /metrics. Every process writes its values to
+# METRICS_DIR, which the endpoint sums, so all gunicorn workers are counted;
+# clear the directory when the server starts. Set METRICS_TOKEN to require
+# "Authorization: Bearer <token>" on scrapes.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "False").lower() == "true"
+METRICS_DIR = os.getenv("METRICS_DIR") or os.path.join(tempfile.gettempdir(), "favour-crochet-metrics")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "1"))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "products.instrumentation": {"handlers": ["console"], "level": "INFO", "propagate": False},
+        "products.jobs": {"handlers": ["console"], "level": "INFO", "propagate": False},
+    },
+}
+
+# Product and category images get WebP and JPEG derivatives at these widths,
+# generated by a background job
+IMAGE_DERIVATIVE_WIDTHS = [int(width) for width in os.getenv("IMAGE_DERIVATIVE_WIDTHS", "320,640,1024").split(",")]
+
+# Background jobs, run by "manage.py run_worker" (see products.jobs). A job
+# claimed by a worker is retried elsewhere if the worker stops renewing its
+# lock for JOB_TIMEOUT seconds. JOBS_RUN_INLINE runs jobs in the web process
+# after the request's transaction commits instead, for local development
+# without a worker.
+JOBS_RUN_INLINE = os.getenv("JOBS_RUN_INLINE", "False").lower() == "true"
+JOB_TIMEOUT = int(os.getenv("JOB_TIMEOUT", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", "7"))
+
+# Absolute catalog URLs a job requests CATALOG_WARM_DELAY seconds after a
+# product or category change, so visitors find them cached again; needs a
+# cache shared between processes (CACHE_BACKEND file or db)
+CATALOG_WARM_URLS = [url for url in os.getenv("CATALOG_WARM_URLS", "").split(",") if url]
+CATALOG_WARM_DELAY = int(os.getenv("CATALOG_WARM_DELAY", "5"))
+
+# Order emails are sent by background jobs; the console backend prints them
+EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend")
+EMAIL_HOST = os.getenv("EMAIL_HOST") or "localhost"
+EMAIL_PORT = int(os.getenv("EMAIL_PORT", "25"))
+EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER", "")
+EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD", "")
+EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", "False").lower() == "true"
+DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL") or "orders@favourcrochet.local"
+
 STATIC_URL = "/static/"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
@@ -105,7 +199,13 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
+    # orjson-backed when installed, same output as the stock JSON classes
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'products.renderers.FastJSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'products.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
 }
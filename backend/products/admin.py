@@ -1,5 +1,14 @@
-from django.contrib import admin
-from .models import Product, Category, Customer, Order, OrderItem
+from django.contrib import admin, messages
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.template.response import TemplateResponse
+from django.utils import timezone
+from .analytics import get_date_range, inventory_report, orders_report, sale_date, sales_report
+from .models import Product, Category, Customer, Order, OrderItem, Job, SalesDashboard, DailyOrderTotals, InsufficientStock
+from .order_export import CONTENT_TYPES, export_rows, stream_export
+from .pagination import EstimatedCountPaginator
+from .search import get_search_backend, get_tokens
+from .tasks import refresh_sales_rollups
 
 
 @admin.register(Category)
@@ -16,7 +25,10 @@ class ProductAdmin(admin.ModelAdmin):
     prepopulated_fields = {"slug": ("title",)}
     list_filter = ("category", "african_style", "is_featured", "is_active", "is_custom_order", "created_at")
     search_fields = ("title", "description", "material")
-    readonly_fields = ("created_at", "updated_at")
+    readonly_fields = ("created_at", "updated_at", "image_derivatives")
+    list_select_related = ("category",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     fieldsets = (
         ("Basic Information", {
             "fields": ("title", "slug", "description", "category", "african_style")
@@ -28,7 +40,7 @@ class ProductAdmin(admin.ModelAdmin):
             "fields": ("material", "colors_available", "sizes_available", "cultural_significance", "care_instructions")
         }),
         ("Images", {
-            "fields": ("primary_image", "image_gallery")
+            "fields": ("primary_image", "image_gallery", "image_derivatives")
         }),
         ("Status", {
             "fields": ("is_featured", "is_active")
@@ -39,6 +51,14 @@ class ProductAdmin(admin.ModelAdmin):
         })
     )
 
+    def get_search_results(self, request, queryset, search_term):
+        # The API's full-text index (also used by the order item autocomplete)
+        backend = get_search_backend()
+        tokens = get_tokens(search_term.split())
+        if backend is None or not tokens:
+            return super().get_search_results(request, queryset, search_term)
+        return backend.search(queryset, tokens), False
+
 
 @admin.register(Customer)
 class CustomerAdmin(admin.ModelAdmin):
@@ -46,21 +66,73 @@ class CustomerAdmin(admin.ModelAdmin):
     list_filter = ("country", "preferred_style", "created_at")
     search_fields = ("user__first_name", "user__last_name", "user__email", "phone")
     readonly_fields = ("created_at",)
+    raw_id_fields = ("user",)
+    ordering = ("-pk",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # Customer.__str__ reads the user, in the change list and in autocomplete results
+        return super().get_queryset(request).select_related("user")
 
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
     readonly_fields = ("total_price",)
+    autocomplete_fields = ("product",)
+
+
+class ShippingCountryFilter(admin.SimpleListFilter):
+    """Shipping countries from the sales rollups, rather than a DISTINCT over every order"""
+    title = "shipping country"
+    parameter_name = "shipping_country"
+
+    def lookups(self, request, model_admin):
+        countries = DailyOrderTotals.objects.order_by("shipping_country").values_list("shipping_country", flat=True)
+        return [(country, country) for country in countries.distinct()]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(shipping_country=self.value())
+        return queryset
+
+
+def status_action(status, label):
+    """An action moving the selected orders to ``status`` through Order.change_status"""
+    @admin.action(description=f"Mark selected orders as {label.lower()}", permissions=["change"])
+    def action(modeladmin, request, queryset):
+        changed, short = 0, []
+        for order in queryset.exclude(status=status).order_by("pk"):
+            try:
+                order.change_status(status)
+            except InsufficientStock:
+                short.append(order.order_number)
+            else:
+                changed += 1
+        modeladmin.message_user(request, f"{changed} order(s) marked as {label.lower()}.")
+        if short:
+            modeladmin.message_user(
+                request, f"Not enough stock to reopen: {', '.join(short)}", level=messages.WARNING
+            )
+
+    action.__name__ = f"mark_{status}"
+    return action
 
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ("order_number", "customer", "status", "total_amount", "created_at")
-    list_filter = ("status", "created_at", "shipping_country")
-    search_fields = ("order_number", "customer__user__first_name", "customer__user__last_name")
-    readonly_fields = ("order_number", "created_at", "updated_at")
+    list_filter = ("status", "created_at", ShippingCountryFilter)
+    search_fields = ("=order_number", "customer__user__first_name", "customer__user__last_name")
+    # Status changes move stock and rollups, so they go through the actions
+    readonly_fields = ("order_number", "status", "created_at", "updated_at")
+    list_select_related = ("customer__user",)
+    autocomplete_fields = ("customer",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     inlines = [OrderItemInline]
+    actions = ["export_csv", "export_jsonl", *(status_action(*choice) for choice in Order.STATUS_CHOICES)]
     fieldsets = (
         ("Order Information", {
             "fields": ("order_number", "customer", "status")
@@ -79,3 +151,135 @@ class OrderAdmin(admin.ModelAdmin):
             "classes": ("collapse",)
         })
     )
+
+    def get_search_results(self, request, queryset, search_term):
+        """An exact order number, or the orders of customers matching the customer admin's search.
+
+        The orders are found through an index (the order number's or the
+        customer foreign key's) instead of scanning every order joined with
+        its user. Matching customers is still a substring scan of the much
+        smaller customer and user tables.
+        """
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        customers, _ = self.admin_site._registry[Customer].get_search_results(
+            request, Customer.objects.all(), search_term
+        )
+        return queryset.filter(
+            Q(order_number__in={search_term, search_term.upper()}) | Q(customer__in=customers.values("pk"))
+        ), False
+
+    # Edits here bypass the API's incremental rollup updates, so the
+    # affected days are recomputed in the background (deletes are
+    # subtracted by a pre_delete signal)
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        self.refresh_rollups([form.instance])
+
+    def refresh_rollups(self, orders):
+        dates = sorted({sale_date(order.created_at).isoformat() for order in orders})
+        refresh_sales_rollups.enqueue(dates=dates, unique=True)
+
+    @admin.action(description="Export selected orders as CSV", permissions=["view"])
+    def export_csv(self, request, queryset):
+        return self.export(queryset, "csv")
+
+    @admin.action(description="Export selected orders as JSON Lines", permissions=["view"])
+    def export_jsonl(self, request, queryset):
+        return self.export(queryset, "jsonl")
+
+    def export(self, queryset, format):
+        """Stream the items of the selected orders, so large selections never sit in memory"""
+        response = StreamingHttpResponse(
+            stream_export(export_rows(queryset), format), content_type=CONTENT_TYPES[format]
+        )
+        filename = f"orders-{timezone.now():%Y%m%d-%H%M%S}.{format}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+
+@admin.register(SalesDashboard)
+class SalesDashboardAdmin(admin.ModelAdmin):
+    """Sales dashboard in place of a change list; reads the daily rollups only"""
+    change_list_template = "admin/products/sales_dashboard.html"
+    day_choices = (7, 30, 90, 365)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        try:
+            days = min(max(int(request.GET.get("days", 30)), 1), 3660)
+        except ValueError:
+            days = 30
+        start, end = get_date_range(days=days)
+        styles = dict(Product.AFRICAN_STYLES)
+        statuses = dict(Order.STATUS_CHOICES)
+
+        by_day = orders_report(["date"], start, end)
+        peak = max((row["revenue"] for row in by_day), default=0)
+        for row in by_day:
+            row["width"] = round(row["revenue"] / peak * 100) if peak else 0
+        totals = {
+            "orders": sum(row["orders"] for row in by_day),
+            "revenue": sum((row["revenue"] for row in by_day), 0),
+        }
+        totals["average_order_value"] = round(totals["revenue"] / totals["orders"], 2) if totals["orders"] else 0
+
+        by_style = sales_report(["african_style"], start, end, limit=20)
+        for row in by_style:
+            row["label"] = styles.get(row["african_style"], row["african_style"] or "None")
+        by_status = orders_report(["status"], start, end, statuses=list(statuses))
+        for row in by_status:
+            row["label"] = statuses.get(row["status"], row["status"])
+
+        context = {
+            **self.admin_site.each_context(request),
+            "title": "Sales dashboard",
+            "opts": self.model._meta,
+            "days": days,
+            "day_choices": self.day_choices,
+            "start": start,
+            "end": end,
+            "totals": totals,
+            "by_day": by_day,
+            "by_style": by_style,
+            "by_category": sales_report(["category"], start, end, limit=10),
+            "top_products": sales_report(["product"], start, end, limit=10),
+            "by_size": sales_report(["size"], start, end, limit=20),
+            "by_country": orders_report(["shipping_country"], start, end),
+            "by_status": by_status,
+            "low_cover": inventory_report(days, end, limit=10),
+            **(extra_context or {}),
+        }
+        return TemplateResponse(request, self.change_list_template, context)
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("task", "status", "attempts", "max_attempts", "run_at", "finished_at", "created_at")
+    list_filter = ("status", "task")
+    search_fields = ("task",)
+    readonly_fields = (
+        "task", "payload", "status", "attempts", "max_attempts", "run_at", "locked_by", "locked_until",
+        "last_error", "created_at", "updated_at", "finished_at",
+    )
+    actions = ["retry_jobs"]
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description="Retry selected jobs")
+    def retry_jobs(self, request, queryset):
+        # Running jobs are left alone; they are retried anyway if their worker died
+        retried = queryset.exclude(status="running").update(
+            status="queued", attempts=0, run_at=timezone.now(), finished_at=None, updated_at=timezone.now()
+        )
+        self.message_user(request, f"{retried} job(s) queued again.")
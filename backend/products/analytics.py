@@ -0,0 +1,315 @@
+"""Daily sales rollups, and the reports read from them.
+
+DailyProductSales and DailyOrderTotals hold per-day sums of order items
+and orders, so reports never scan Order or OrderItem. Orders count
+towards the day they were placed on, and the rollups are kept up to date
+incrementally:
+
+- orders placed through the API are added in the transaction that
+  creates them (``record_new_order``);
+- a status change moves the order's sums from its old status to the new
+  one (``record_status_change``, from the order_status_changed signal);
+- a new shipping country moves them the same way (``record_order_change``,
+  from OrderViewSet), and deleted orders are subtracted by a pre_delete
+  signal;
+- orders changed any other way (admin edits, generate_catalog) are
+  counted by recomputing their days from scratch (``refresh_days``), which
+  the admin queues as a job and ``backfill_sales_rollups`` runs over the
+  whole history.
+"""
+import datetime
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, FloatField, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce, NullIf, TruncDate
+from django.utils import timezone
+
+from .models import DailyOrderTotals, DailyProductSales, Order, OrderItem, Product
+
+
+# Rollup columns and the OrderItem / Order lookups they are grouped by
+SALES_COLUMNS = {
+    'product_id': 'product',
+    'category_id': 'product__category',
+    'african_style': 'product__african_style',
+    'size': 'size',
+    'color': 'color',
+    'shipping_country': 'order__shipping_country',
+    'status': 'order__status',
+}
+SALES_KEY = ['date', 'product_id', 'size', 'color', 'shipping_country', 'status']
+SALES_MEASURES = ['quantity', 'revenue', 'items']
+ORDER_KEY = ['date', 'shipping_country', 'status']
+ORDER_MEASURES = ['orders', 'revenue']
+
+# First key of the PostgreSQL advisory locks on rollup days; the second is the day's ordinal
+ROLLUP_LOCK = 0x5a1e
+
+# Statuses counted as sales unless a report asks for others
+SALES_STATUSES = [value for value, label in Order.STATUS_CHOICES if value != 'cancelled']
+
+# Report dimensions and the rollup fields each one returns
+SALES_DIMENSIONS = {
+    'date': ['date'],
+    'product': ['product', 'product__title'],
+    'category': ['category', 'category__name'],
+    'african_style': ['african_style'],
+    'size': ['size'],
+    'color': ['color'],
+    'shipping_country': ['shipping_country'],
+    'status': ['status'],
+}
+ORDER_DIMENSIONS = ['date', 'shipping_country', 'status']
+
+
+def day_start(date):
+    """The first moment of ``date``, in the current time zone when USE_TZ is on"""
+    start = datetime.datetime.combine(date, datetime.time.min)
+    return timezone.make_aware(start) if settings.USE_TZ else start
+
+
+def sale_date(moment):
+    return timezone.localdate(moment) if timezone.is_aware(moment) else moment.date()
+
+
+def sales_totals(orders):
+    """Item sums of ``orders`` per rollup row, in SALES_COLUMNS order then date and measures"""
+    return (
+        OrderItem.objects.filter(order__in=orders)
+        .values(*SALES_COLUMNS.values(), date=TruncDate('order__created_at'))
+        .annotate(quantity=Sum('quantity'), revenue=Sum('total_price'), items=Count('pk'))
+        .order_by()
+    )
+
+
+def order_totals(orders):
+    """Order sums of ``orders`` per rollup row: shipping country, status, date and measures"""
+    return (
+        orders.values('shipping_country', 'status', date=TruncDate('created_at'))
+        .annotate(orders=Count('pk'), revenue=Sum('total_amount'))
+        .order_by()
+    )
+
+
+def sales_rows(orders, status=None):
+    """DailyProductSales rows for the items of ``orders``, optionally counted under ``status``"""
+    for row in sales_totals(orders):
+        values = {column: row[lookup] for column, lookup in SALES_COLUMNS.items()}
+        values.update(date=row['date'], quantity=row['quantity'], revenue=row['revenue'], items=row['items'])
+        if status is not None:
+            values['status'] = status
+        yield values
+
+
+def order_rows(orders, status=None):
+    """DailyOrderTotals rows for ``orders``, optionally counted under ``status``"""
+    for row in order_totals(orders):
+        if status is not None:
+            row['status'] = status
+        yield row
+
+
+def lock_days(start, end, shared=False):
+    """Lock the rollup days from ``start`` to ``end`` until the transaction ends (PostgreSQL only).
+
+    Increments take shared locks, so they never wait for each other, while
+    ``refresh_days`` takes exclusive ones. Days are locked in ascending
+    order, so the two cannot deadlock.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    function = 'pg_advisory_xact_lock_shared' if shared else 'pg_advisory_xact_lock'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT {function}(%s, day) FROM generate_series(%s, %s) AS day ORDER BY day',
+            [ROLLUP_LOCK, start.toordinal(), end.toordinal()],
+        )
+
+
+def add_to_rollup(model, key, measures, rows, sign=1):
+    """Add ``rows`` to the rollup's measures (or subtract them with ``sign=-1``), creating missing rows.
+
+    Each row is one ``INSERT ... ON CONFLICT DO UPDATE`` (PostgreSQL, and
+    SQLite from 3.24), so concurrent orders never lose an increment.
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    for date in sorted({row['date'] for row in rows}):
+        lock_days(date, date, shared=True)
+    fields = [model._meta.get_field(column) for column in rows[0]]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    sql = 'INSERT INTO {} ({}) VALUES ({}) ON CONFLICT ({}) DO UPDATE SET {}'.format(
+        table,
+        ', '.join(quote(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+        ', '.join(quote(model._meta.get_field(column).column) for column in key),
+        ', '.join(f'{quote(column)} = {table}.{quote(column)} + EXCLUDED.{quote(column)}' for column in measures),
+    )
+    params = []
+    for row in rows:
+        params.append([
+            field.get_db_prep_value(row[field.attname] * sign if field.attname in measures else row[field.attname], connection)
+            for field in fields
+        ])
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def record_orders(orders, sign=1, status=None):
+    """Add the orders of the ``orders`` queryset to the rollups (or remove them with ``sign=-1``)"""
+    add_to_rollup(DailyProductSales, SALES_KEY, SALES_MEASURES, sales_rows(orders, status), sign)
+    add_to_rollup(DailyOrderTotals, ORDER_KEY, ORDER_MEASURES, order_rows(orders, status), sign)
+
+
+def record_new_order(order, items, products):
+    """Add a just-created order to the rollups from its in-memory ``items``, without reading them back.
+
+    ``products`` maps each product id to its ``(category_id, african_style)``.
+    """
+    date = sale_date(order.created_at)
+    sales = {}
+    for item in items:
+        key = (item.product_id, item.size, item.color)
+        row = sales.setdefault(key, {
+            'date': date, 'product_id': item.product_id,
+            'category_id': products[item.product_id][0], 'african_style': products[item.product_id][1],
+            'size': item.size, 'color': item.color,
+            'shipping_country': order.shipping_country, 'status': order.status,
+            'quantity': 0, 'revenue': 0, 'items': 0,
+        })
+        row['quantity'] += item.quantity
+        row['revenue'] += item.total_price
+        row['items'] += 1
+    add_to_rollup(DailyProductSales, SALES_KEY, SALES_MEASURES, sales.values())
+    add_to_rollup(DailyOrderTotals, ORDER_KEY, ORDER_MEASURES, [{
+        'date': date, 'shipping_country': order.shipping_country, 'status': order.status,
+        'orders': 1, 'revenue': order.total_amount,
+    }])
+
+
+def record_status_change(order, old_status):
+    """Move ``order``'s sums from ``old_status`` to its current status"""
+    orders = Order.objects.filter(pk=order.pk)
+    record_orders(orders, sign=-1, status=old_status)
+    record_orders(orders)
+
+
+@contextmanager
+def record_order_change(order):
+    """Subtract ``order``'s sums, run the block that changes it, then add them back"""
+    orders = Order.objects.filter(pk=order.pk)
+    with transaction.atomic():
+        record_orders(orders, sign=-1)
+        yield
+        record_orders(orders)
+
+
+def insert_totals(model, columns, totals):
+    """Insert the rows of a ``*_totals()`` queryset with one INSERT ... SELECT; returns the row count"""
+    quote = connection.ops.quote_name
+    sql, params = totals.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'INSERT INTO {} ({}) {}'.format(
+                quote(model._meta.db_table),
+                ', '.join(quote(model._meta.get_field(column).column) for column in columns),
+                sql,
+            ),
+            params,
+        )
+        return cursor.rowcount
+
+
+def refresh_days(start, end=None):
+    """Recompute the rollups of the days from ``start`` to ``end`` (inclusive); returns rows written.
+
+    The rows are aggregated and inserted by the database in one statement
+    per table, so memory use does not grow with the range. On PostgreSQL the
+    days are locked against concurrent increments until the new rows are
+    committed (see ``lock_days``), so an order placed meanwhile is counted
+    exactly once, while orders on other days go ahead.
+    """
+    end = end or start
+    with transaction.atomic():
+        lock_days(start, end)
+        DailyProductSales.objects.filter(date__range=(start, end)).delete()
+        DailyOrderTotals.objects.filter(date__range=(start, end)).delete()
+        orders = Order.objects.filter(
+            created_at__gte=day_start(start), created_at__lt=day_start(end + datetime.timedelta(days=1))
+        )
+        return (
+            insert_totals(DailyProductSales, [*SALES_COLUMNS, 'date', *SALES_MEASURES], sales_totals(orders))
+            + insert_totals(DailyOrderTotals, ['shipping_country', 'status', 'date', *ORDER_MEASURES], order_totals(orders))
+        )
+
+
+def get_date_range(start=None, end=None, days=30):
+    end = end or sale_date(timezone.now())
+    return start or end - datetime.timedelta(days=days - 1), end
+
+
+def sales_report(group_by, start, end, statuses=None, filters=None, order_by='-revenue', limit=100):
+    """Quantity, revenue and item counts from DailyProductSales, grouped by ``group_by`` dimensions"""
+    fields = [field for dimension in group_by for field in SALES_DIMENSIONS[dimension]]
+    queryset = DailyProductSales.objects.filter(
+        date__range=(start, end), status__in=statuses or SALES_STATUSES, **(filters or {})
+    )
+    return list(
+        queryset.values(*fields)
+        .annotate(quantity=Sum('quantity'), revenue=Sum('revenue'), items=Sum('items'))
+        # Rows emptied by status changes
+        .exclude(items=0)
+        .order_by(order_by, *fields)[:limit]
+    )
+
+
+def orders_report(group_by, start, end, statuses=None):
+    """Order counts, revenue and average order value from DailyOrderTotals"""
+    rows = (
+        DailyOrderTotals.objects.filter(date__range=(start, end), status__in=statuses or SALES_STATUSES)
+        .values(*group_by)
+        .annotate(orders=Sum('orders'), revenue=Sum('revenue'))
+        .exclude(orders=0)
+        .order_by(*group_by)
+    )
+    results = []
+    for row in rows:
+        row['average_order_value'] = (row['revenue'] / row['orders']).quantize(Decimal('0.01'))
+        results.append(row)
+    return results
+
+
+def inventory_report(days=30, end=None, limit=100):
+    """Stocked products by days of cover: current stock over the average daily units sold in ``days``"""
+    start, end = get_date_range(end=end, days=days)
+    units_sold = (
+        DailyProductSales.objects.filter(
+            product=OuterRef('pk'), date__range=(start, end), status__in=SALES_STATUSES
+        )
+        .values('product')
+        .annotate(units=Sum('quantity'))
+        .values('units')
+    )
+    products = (
+        Product.objects.filter(is_active=True, is_custom_order=False)
+        .annotate(units_sold=Coalesce(Subquery(units_sold), 0))
+        # NULL for unsold products
+        .annotate(cover=Cast('stock_quantity', FloatField()) * days / NullIf('units_sold', 0))
+        # Products that run out soonest first; unsold products last
+        .order_by(F('cover').asc(nulls_last=True), '-units_sold', 'pk')
+        .values('id', 'title', 'category__name', 'african_style', 'stock_quantity', 'units_sold', 'cover')[:limit]
+    )
+    results = []
+    for product in products:
+        cover = product.pop('cover')
+        product.update(
+            daily_units=round(product['units_sold'] / days, 2),
+            days_of_cover=round(cover, 1) if cover is not None else None,
+        )
+        results.append(product)
+    return results
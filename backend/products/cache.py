@@ -0,0 +1,58 @@
+"""Response cache for the public, read-only catalog endpoints.
+
+Cached responses are keyed on the absolute URL (path plus normalized query
+parameters) and a catalog version. Saving or deleting a Product or Category
+bumps the version (see products.signals), which orphans every cached entry
+at once instead of tracking individual keys.
+"""
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from .metrics import CATALOG_CACHE
+
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # A timestamp, not a counter, so an evicted version never reuses an old key
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def invalidate_catalog():
+    cache.set(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def get_catalog_cache_key(request, prefix='response'):
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    url = f'{request.build_absolute_uri(request.path)}?{query}'
+    digest = hashlib.md5(url.encode()).hexdigest()
+    return f'catalog:{get_catalog_version()}:{prefix}:{digest}'
+
+
+def cache_catalog_response(view_method):
+    """Cache the data of successful responses from a catalog view method."""
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = get_catalog_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            CATALOG_CACHE.inc(endpoint=view_method.__name__, result='hit')
+            return Response(data)
+        CATALOG_CACHE.inc(endpoint=view_method.__name__, result='miss')
+
+        response = view_method(self, request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.CATALOG_CACHE_TIMEOUT)
+        return response
+    return wrapper
@@ -0,0 +1,152 @@
+"""Streaming product catalog import/export (CSV and JSON Lines).
+
+Used by the ``import_products`` and ``export_products`` management
+commands. Rows are read, converted and written one chunk at a time, so
+memory use does not grow with the file size.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.utils.text import slugify
+
+from .models import Product
+
+
+# Column order for exports; ``category`` holds the category slug
+FIELDS = [
+    'slug', 'title', 'description', 'price', 'category', 'african_style', 'material',
+    'colors_available', 'sizes_available', 'primary_image', 'image_gallery',
+    'stock_quantity', 'is_custom_order', 'estimated_delivery_days', 'is_featured',
+    'is_active', 'cultural_significance', 'care_instructions',
+]
+JSON_FIELDS = {'colors_available', 'sizes_available', 'image_gallery'}
+INTEGER_FIELDS = {'stock_quantity', 'estimated_delivery_days'}
+BOOLEAN_FIELDS = {'is_custom_order', 'is_featured', 'is_active'}
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+
+FORMATS = ('csv', 'jsonl')
+
+
+def guess_format(path):
+    return 'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def read_rows(file, format, on_error=None):
+    """Yield ``(line_number, row)`` pairs from an open text file.
+
+    Malformed JSON lines are passed to ``on_error(line_number, error)`` and
+    skipped; without ``on_error`` they raise ValueError.
+    """
+    if format == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError('expected a JSON object')
+            except ValueError as error:
+                if on_error is None:
+                    raise ValueError(f'Line {line_number}: {error}')
+                on_error(line_number, error)
+                continue
+            yield line_number, row
+
+
+def is_provided(value):
+    """Absent, null and empty values (blank CSV cells) keep what is stored."""
+    return value is not None and value != ''
+
+
+def provided_fields(row):
+    """The FIELDS an import row sets."""
+    return frozenset(field for field in FIELDS if is_provided(row.get(field)))
+
+
+def row_slug(row):
+    """The slug an import row upserts on: its own, or its title's."""
+    return row.get('slug') or slugify(row.get('title') or '')
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def row_to_product(row, category_ids, existing_slugs=()):
+    """Build an unsaved Product from an import row; raises ValueError on bad data.
+
+    Rows for ``existing_slugs`` are updates and may leave out any column;
+    new products need a category, title and price.
+    """
+    values = {}
+    for field in FIELDS:
+        if not is_provided(row.get(field)):
+            continue
+        value = row[field]
+        if field == 'category':
+            if value not in category_ids:
+                raise ValueError(f'unknown category {value!r}')
+            values['category_id'] = category_ids[value]
+            continue
+        if field == 'price':
+            try:
+                value = Decimal(str(value))
+            except InvalidOperation:
+                raise ValueError(f'invalid price {value!r}')
+        elif field in INTEGER_FIELDS:
+            value = int(value)
+            if value < 0:
+                raise ValueError(f'negative {field} {value}')
+        elif field in BOOLEAN_FIELDS and isinstance(value, str):
+            value = value.strip().lower() in TRUE_VALUES
+        elif field in JSON_FIELDS and isinstance(value, str):
+            value = json.loads(value) if value.strip() else []
+        values[field] = value
+
+    values['slug'] = row_slug(row)
+    if not values['slug']:
+        raise ValueError('missing slug and title')
+    if values['slug'] not in existing_slugs:
+        if 'category_id' not in values:
+            raise ValueError('missing category')
+        if 'title' not in values:
+            raise ValueError('missing title')
+        if 'price' not in values:
+            raise ValueError('missing price')
+    return Product(**values)
+
+
+def export_rows(queryset, chunk_size):
+    """Yield export rows (dicts keyed by FIELDS) with a server-side cursor."""
+    columns = [('category__slug' if field == 'category' else field) for field in FIELDS]
+    for values in queryset.order_by('pk').values_list(*columns).iterator(chunk_size=chunk_size):
+        yield dict(zip(FIELDS, values))
+
+
+class RowWriter:
+    """Write export rows as CSV (JSON-encoding list fields) or JSON Lines."""
+
+    def __init__(self, file, format, fields=FIELDS, json_fields=JSON_FIELDS):
+        self.file = file
+        self.format = format
+        self.json_fields = json_fields
+        if format == 'csv':
+            self.csv = csv.DictWriter(file, fieldnames=fields)
+            self.csv.writeheader()
+
+    def write(self, row):
+        if self.format == 'csv':
+            self.csv.writerow({
+                field: json.dumps(value) if field in self.json_fields else value
+                for field, value in row.items()
+            })
+        else:
+            self.file.write(json.dumps(row, default=str) + '\n')
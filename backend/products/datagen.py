@@ -0,0 +1,238 @@
+"""Synthetic catalog, customer and order data for benchmarks and load tests.
+
+Everything is generated from ``random.Random`` seeded by the caller, with
+timestamps and order numbers counted back from a fixed ``end`` date, so a given
+seed always produces the same rows, and inserted with ``bulk_create`` in
+batches. Generated slugs and usernames embed the seed,
+so different seeds can share a database.
+"""
+import math
+import random
+from contextlib import contextmanager
+from itertools import accumulate
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+
+from .analytics import day_start
+from .models import Category, Customer, Order, OrderItem, Product
+from .order_numbers import RANDOM_BITS, format_order_number
+
+
+WORDS = [
+    'handmade', 'crochet', 'dress', 'kente', 'ankara', 'dashiki', 'kaftan', 'cotton', 'silk',
+    'wool', 'blend', 'vibrant', 'royal', 'gold', 'blue', 'earth', 'pattern', 'woven', 'bead',
+    'wrap', 'maxi', 'tunic', 'skirt', 'festival', 'wedding', 'heritage', 'elegant', 'modern',
+    'traditional', 'geometric', 'embroidered', 'bag', 'scarf', 'head', 'yoruba', 'ashanti',
+]
+
+# Filler vocabulary so that real words like "kente" match a realistic share of products
+SYLLABLES = ['ka', 'lo', 'mi', 'ze', 'tu', 'ra', 'no', 'bi', 'se', 'wu']
+VOCABULARY = WORDS + [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+
+MATERIALS = ['Premium Cotton Blend', '100% Cotton', 'Silk Blend', 'Wool', 'Durable Cotton Thread']
+COLORS = ['Royal Blue', 'Gold', 'White', 'Black', 'Red', 'Green', 'Earth Brown', 'Orange', 'Purple', 'Natural']
+COUNTRIES = ['Nigeria', 'Ghana', 'United Kingdom', 'United States', 'Canada', 'Kenya', 'South Africa']
+
+# Relative popularity; the first entries of each list are the most common
+STYLE_WEIGHTS = [1 / rank for rank in range(1, len(Product.AFRICAN_STYLES) + 1)]
+SIZE_WEIGHTS = {'XS': 4, 'S': 10, 'M': 18, 'L': 18, 'XL': 12, 'XXL': 6, 'XXXL': 3, 'custom': 2}
+COUNTRY_WEIGHTS = [50, 15, 12, 10, 5, 4, 4]
+STATUS_WEIGHTS = {
+    'pending': 5, 'confirmed': 5, 'in_progress': 5, 'ready': 3,
+    'shipped': 10, 'delivered': 65, 'cancelled': 7,
+}
+ITEMS_PER_ORDER_WEIGHTS = [45, 25, 15, 8, 4, 2, 1]
+
+# How far back generated created_at timestamps reach, from END by default
+HISTORY = timedelta(days=365)
+END = date(2026, 1, 1)
+
+
+def sentence(rng, length):
+    return ' '.join(rng.choice(VOCABULARY) for _ in range(length)).capitalize() + '.'
+
+
+def past_timestamp(rng, now):
+    # Skewed towards recent dates, like a growing shop
+    return now - HISTORY * (1 - math.sqrt(rng.random()))
+
+
+@contextmanager
+def historical_timestamps(*models):
+    """Let bulk_create keep explicit created_at/updated_at values on ``models``."""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def batched_insert(model, objects, batch_size):
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) == batch_size:
+            model.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+
+
+def generate_categories(count, seed=0, end=END):
+    # Categories predate the generated products and orders
+    created_at = day_start(end) - HISTORY
+    with historical_timestamps(Category):
+        return Category.objects.bulk_create([
+            Category(
+                name=f'Generated Category {i}', slug=f'generated-category-{seed}-{i}',
+                created_at=created_at, updated_at=created_at,
+            )
+            for i in range(count)
+        ])
+
+
+def generate_products(count, categories, seed=0, start=0, batch_size=1000, end=END):
+    """Bulk insert ``count`` products spread over ``categories``, created before ``end``."""
+    rng = random.Random(f'{seed}-{start}')
+    styles = [choice[0] for choice in Product.AFRICAN_STYLES]
+    sizes = [choice[0] for choice in Product.SIZES]
+    # A few large categories and a long tail of small ones
+    category_weights = list(accumulate(1 / (rank + 1) ** 0.8 for rank in range(len(categories))))
+    end = day_start(end)
+
+    def products():
+        for i in range(start, start + count):
+            created_at = past_timestamp(rng, end)
+            yield Product(
+                title=f'{rng.choice(WORDS).capitalize()} {sentence(rng, 2)[:-1]} {i}',
+                slug=f'generated-product-{seed}-{i}',
+                description=sentence(rng, 30),
+                # Log-normal around ₦15,000, rounded to the nearest ₦100
+                price=Decimal(max(500, round(rng.lognormvariate(math.log(15000), 0.5), -2))),
+                category=rng.choices(categories, cum_weights=category_weights)[0],
+                african_style=rng.choices(styles, STYLE_WEIGHTS)[0],
+                material=rng.choice(MATERIALS),
+                colors_available=rng.sample(COLORS, rng.randint(1, 4)),
+                sizes_available=sorted(rng.sample(sizes, rng.randint(1, 6)), key=sizes.index),
+                stock_quantity=rng.choice([0, 0, 0, 1, 2, 5, 10, 25, 50]),
+                is_custom_order=rng.random() < 0.1,
+                estimated_delivery_days=rng.choice([3, 7, 7, 14, 21]),
+                is_featured=rng.random() < 0.02,
+                is_active=rng.random() < 0.9,
+                cultural_significance=sentence(rng, 20),
+                created_at=created_at,
+                updated_at=created_at,
+            )
+
+    with historical_timestamps(Product):
+        batched_insert(Product, products(), batch_size)
+
+
+def generate_customers(count, seed=0, batch_size=1000, end=END):
+    """Bulk insert ``count`` users with customer profiles, joined before ``end``; returns the customer ids."""
+    rng = random.Random(f'{seed}-customers')
+    prefix = f'generated-{seed}-'
+    end = day_start(end)
+    joined = [past_timestamp(rng, end) for _ in range(count)]
+    batched_insert(User, (
+        User(
+            username=f'{prefix}{i}', email=f'{prefix}{i}@example.com',
+            first_name=rng.choice(['Ada', 'Kofi', 'Amara', 'Tunde', 'Zainab', 'Kwame', 'Ngozi']),
+            last_name=rng.choice(['Okafor', 'Mensah', 'Adeyemi', 'Boateng', 'Bello', 'Owusu']),
+            password='!',  # Unusable password
+            date_joined=joined[i],
+        )
+        for i in range(count)
+    ), batch_size)
+    users = User.objects.filter(username__startswith=prefix).order_by('pk').values_list('pk', 'date_joined')
+    with historical_timestamps(Customer):
+        batched_insert(Customer, (
+            Customer(
+                user_id=user_id,
+                country=rng.choices(COUNTRIES, COUNTRY_WEIGHTS)[0],
+                preferred_style=rng.choices(Product.AFRICAN_STYLES, STYLE_WEIGHTS)[0][0],
+                created_at=date_joined,
+            )
+            for user_id, date_joined in users.iterator()
+        ), batch_size)
+    return list(Customer.objects.filter(user__username__startswith=prefix).order_by('pk').values_list('pk', flat=True))
+
+
+def generate_orders(count, customer_ids, seed=0, batch_size=1000, progress=None, end=END):
+    """Bulk insert ``count`` orders with 1-7 items each over the seed's active products, placed before ``end``."""
+    rng = random.Random(f'{seed}-orders')
+    # Only the products generate_products made for this seed, so other rows
+    # in the database cannot change what a seed generates
+    products = list(
+        Product.objects.filter(is_active=True, slug__startswith=f'generated-product-{seed}-')
+        .order_by('pk').values_list('pk', 'price', 'sizes_available')
+    )
+    if not products or not customer_ids:
+        return
+    # Popular products sell far more often than the long tail
+    # (cumulative weights, so each pick is a bisect rather than a pass over the list)
+    product_weights = list(accumulate(1 / (rank + 1) ** 0.7 for rank in range(len(products))))
+    statuses, status_weights = zip(*STATUS_WEIGHTS.items())
+    item_counts = range(1, len(ITEMS_PER_ORDER_WEIGHTS) + 1)
+    tax_rate = Decimal('0.10')
+    shipping_cost = Decimal('15.00')
+    end = day_start(end)
+
+    with historical_timestamps(Order, OrderItem):
+        for batch_start in range(0, count, batch_size):
+            orders, order_items = [], []
+            for _ in range(min(batch_size, count - batch_start)):
+                created_at = past_timestamp(rng, end)
+                lines = []
+                for product_id, price, sizes in rng.choices(
+                    products, cum_weights=product_weights, k=rng.choices(item_counts, ITEMS_PER_ORDER_WEIGHTS)[0]
+                ):
+                    quantity = rng.choices([1, 2, 3], [80, 15, 5])[0]
+                    lines.append(OrderItem(
+                        product_id=product_id,
+                        quantity=quantity,
+                        size=rng.choices(sizes, [SIZE_WEIGHTS.get(size, 1) for size in sizes])[0][:10] if sizes else '',
+                        color=rng.choice(COLORS),
+                        unit_price=price,
+                        total_price=price * quantity,
+                        created_at=created_at,
+                    ))
+                subtotal = sum(line.total_price for line in lines)
+                tax_amount = (subtotal * tax_rate).quantize(Decimal('0.01'))
+                country = rng.choices(COUNTRIES, COUNTRY_WEIGHTS)[0]
+                orders.append(Order(
+                    customer_id=rng.choice(customer_ids),
+                    # Same format as generate_order_number, from created_at and the seed
+                    order_number=format_order_number(
+                        int(created_at.timestamp() * 1000), rng.getrandbits(RANDOM_BITS)
+                    ),
+                    status=rng.choices(statuses, status_weights)[0],
+                    subtotal=subtotal,
+                    tax_amount=tax_amount,
+                    shipping_cost=shipping_cost,
+                    total_amount=subtotal + tax_amount + shipping_cost,
+                    shipping_address=f'{rng.randint(1, 200)} Generated Street',
+                    shipping_city='Lagos' if country == 'Nigeria' else 'Capital City',
+                    shipping_country=country,
+                    shipping_postal_code=str(rng.randint(10000, 99999)),
+                    created_at=created_at,
+                    updated_at=created_at,
+                ))
+                order_items.append(lines)
+
+            Order.objects.bulk_create(orders)
+            for order, lines in zip(orders, order_items):
+                for line in lines:
+                    line.order_id = order.pk
+            OrderItem.objects.bulk_create([line for lines in order_items for line in lines])
+            if progress:
+                progress(batch_start + len(orders))
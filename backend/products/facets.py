@@ -0,0 +1,75 @@
+"""Facet counts for the product filter sidebar.
+
+Every facet is a grouped aggregate over the filtered product queryset, so
+the whole payload costs three queries whatever the catalog size.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .cache import get_catalog_version
+from .metrics import CATALOG_CACHE
+from .models import Product
+
+
+# Lower edges of the price buckets; the last bucket is open-ended
+PRICE_BUCKETS = [0, 10000, 20000, 30000, 50000]
+
+
+def get_facets(queryset):
+    queryset = queryset.order_by()
+
+    style_counts = dict(
+        queryset.values_list('african_style').annotate(count=Count('pk'))
+    )
+    categories = (
+        queryset.values('category', 'category__name')
+        .annotate(count=Count('pk'))
+        .order_by('category__name')
+    )
+
+    edges = list(zip(PRICE_BUCKETS, PRICE_BUCKETS[1:] + [None]))
+    price_counts = {}
+    for index, (low, high) in enumerate(edges):
+        condition = Q(price__gte=low)
+        if high is not None:
+            condition &= Q(price__lt=high)
+        price_counts[f'price_{index}'] = Count('pk', filter=condition)
+    totals = queryset.aggregate(
+        total=Count('pk'),
+        # Same condition as ?in_stock=true: made-to-order products are always available
+        in_stock=Count('pk', filter=Q(stock_quantity__gt=0) | Q(is_custom_order=True)),
+        custom_order=Count('pk', filter=Q(is_custom_order=True)),
+        **price_counts,
+    )
+
+    return {
+        'total': totals['total'],
+        'african_style': [
+            {'value': value, 'label': label, 'count': style_counts.get(value, 0)}
+            for value, label in Product.AFRICAN_STYLES
+        ],
+        'category': [
+            {'value': row['category'], 'label': row['category__name'], 'count': row['count']}
+            for row in categories
+        ],
+        'price': [
+            {'min': low, 'max': high, 'count': totals[f'price_{index}']}
+            for index, (low, high) in enumerate(edges)
+        ],
+        'availability': {
+            'in_stock': totals['in_stock'],
+            'custom_order': totals['custom_order'],
+        },
+    }
+
+
+def get_catalog_facets(queryset):
+    """Facets for the unfiltered catalog, computed once per catalog version."""
+    key = f'catalog:{get_catalog_version()}:facets'
+    facets = cache.get(key)
+    CATALOG_CACHE.inc(endpoint='facets', result='miss' if facets is None else 'hit')
+    if facets is None:
+        facets = get_facets(queryset)
+        cache.set(key, facets, settings.CATALOG_CACHE_TIMEOUT)
+    return facets
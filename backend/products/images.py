@@ -0,0 +1,161 @@
+"""Resized WebP and JPEG derivatives of product and category images.
+
+When a product or category is saved with an image that has no
+derivatives yet, a background job (see products.tasks) generates them,
+so admin saves do not wait for Pillow. The result is stored on the
+object's ``image_derivatives`` field, keyed by source image name::
+
+    {"products/kente.jpg": {
+        "width": 2400, "height": 1600,
+        "derivatives": [
+            {"format": "webp", "width": 320, "height": 213,
+             "name": "derivatives/products/kente-320w.webp", "bytes": 9120},
+            ...
+        ]}}
+
+Serializers turn a record into ``srcset`` strings with ``get_srcset``.
+"""
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .cache import invalidate_catalog
+
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    # format: (file extension, Pillow save options)
+    'webp': ('webp', {'format': 'WEBP', 'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True}),
+}
+DERIVATIVES_PREFIX = 'derivatives'
+
+
+def get_image_names(instance):
+    """Storage names of the local images on a Product or Category"""
+    field = instance._meta.get_field('primary_image' if hasattr(instance, 'primary_image') else 'image')
+    image = getattr(instance, field.name)
+    names = [image.name] if image else []
+    # Gallery entries may also be external URLs; only storage paths are processed
+    for entry in getattr(instance, 'image_gallery', None) or []:
+        if isinstance(entry, str) and entry and '://' not in entry and not entry.startswith('/'):
+            names.append(entry)
+    return field.storage, names
+
+
+def derivative_name(source, width, extension):
+    stem = os.path.splitext(source)[0]
+    return f'{DERIVATIVES_PREFIX}/{stem}-{width}w.{extension}'
+
+
+def generate_derivatives(storage, source, widths=None):
+    """Write every derivative of ``source`` and return its record"""
+    widths = sorted(widths or settings.IMAGE_DERIVATIVE_WIDTHS)
+    with storage.open(source, 'rb') as file:
+        image = Image.open(file)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    original_width, original_height = image.size
+
+    # Never upscale; an image narrower than every width gets one derivative
+    # at its own size
+    targets = [width for width in widths if width < original_width] or [original_width]
+    derivatives = []
+    for width in targets:
+        height = max(1, round(original_height * width / original_width))
+        resized = image.resize((width, height), Image.LANCZOS) if width != original_width else image
+        for format, (extension, options) in FORMATS.items():
+            converted = resized
+            if format == 'jpeg' and resized.mode != 'RGB':
+                converted = resized.convert('RGB')
+            elif format == 'webp' and resized.mode not in ('RGB', 'RGBA'):
+                converted = resized.convert('RGBA' if 'A' in resized.getbands() else 'RGB')
+            buffer = BytesIO()
+            converted.save(buffer, **options)
+            name = derivative_name(source, width, extension)
+            if storage.exists(name):
+                storage.delete(name)
+            name = storage.save(name, ContentFile(buffer.getvalue()))
+            derivatives.append({
+                'format': format, 'width': width, 'height': height,
+                'name': name, 'bytes': buffer.tell(),
+            })
+    return {'width': original_width, 'height': original_height, 'derivatives': derivatives}
+
+
+def delete_derivatives(storage, record):
+    for derivative in record.get('derivatives', []):
+        storage.delete(derivative['name'])
+
+
+def process_instance(model, pk, force=False):
+    """Bring ``image_derivatives`` in line with the current images of one object.
+
+    With ``force``, existing derivatives are deleted and regenerated.
+    Returns whether the record changed.
+    """
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return False
+    storage, names = get_image_names(instance)
+    existing = instance.image_derivatives or {}
+    # Derivatives to keep; the rest are deleted before anything is regenerated
+    kept = {} if force else {name: record for name, record in existing.items() if name in names}
+    for name, record in existing.items():
+        if name not in kept:
+            delete_derivatives(storage, record)
+
+    records = {}
+    for name in names:
+        if name in kept:
+            records[name] = kept[name]
+            continue
+        try:
+            records[name] = generate_derivatives(storage, name)
+        except (OSError, Image.DecompressionBombError) as error:
+            logger.warning('Could not generate derivatives of %s: %s', name, error)
+
+    if records != existing:
+        fields = {'image_derivatives': records}
+        if hasattr(instance, 'updated_at'):
+            fields['updated_at'] = timezone.now()
+        # update() rather than save(): no signals, so no rescheduling
+        model.objects.filter(pk=pk).update(**fields)
+        invalidate_catalog()
+        return True
+    return False
+
+
+def needs_derivatives(instance):
+    _, names = get_image_names(instance)
+    return set(names) != set(instance.image_derivatives or {})
+
+
+def get_srcset(record, request=None, storage=None, format='webp'):
+    """``"url 320w, url 640w"`` for one format of a derivatives record, or None"""
+    if not record:
+        return None
+    storage = storage or default_storage
+    candidates = []
+    for derivative in record['derivatives']:
+        if derivative['format'] != format:
+            continue
+        url = storage.url(derivative['name'])
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        candidates.append(f'{url} {derivative["width"]}w')
+    return ', '.join(candidates) or None
+
+
+def get_srcsets(record, request=None, storage=None):
+    """``{"webp": srcset, "jpeg": srcset}`` for a derivatives record, or None"""
+    if not record:
+        return None
+    return {format: get_srcset(record, request, storage, format) for format in FORMATS}
@@ -0,0 +1,133 @@
+"""Per-request timing and query instrumentation.
+
+``RequestInstrumentationMiddleware`` records wall time, database query
+count and time (through ``connection.execute_wrapper``), serializer time
+and response size for every request. It adds them to the response as a
+``Server-Timing`` header and logs one JSON line per request to the
+``products.instrumentation`` logger. The same SQL run several times in one
+request (an N+1 pattern) is logged as a warning naming the view.
+
+Enable it with ``REQUEST_INSTRUMENTATION=true``. When disabled the
+middleware removes itself at startup and serializers only check a context
+variable, so the cost is negligible.
+"""
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework import serializers
+
+
+logger = logging.getLogger(__name__)
+
+# Metrics of the request being handled, or None when instrumentation is off
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.query_count = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.query_count += 1
+            # SQL keeps its placeholders, so the same query with different
+            # parameters counts as a repeat
+            self.statements[sql] += 1
+
+    def duplicate_queries(self, threshold):
+        return [(sql, count) for sql, count in self.statements.most_common() if count >= threshold]
+
+
+class TimedSerializerMixin:
+    """Add the time spent building ``serializer.data`` to the current request's metrics."""
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_serializer = super().many_init(*args, **kwargs)
+        # Time the list as a whole; its children are not timed separately
+        if type(list_serializer) is serializers.ListSerializer:
+            list_serializer.__class__ = TimedListSerializer
+        return list_serializer
+
+    @property
+    def data(self):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return super().data
+        start = time.perf_counter()
+        try:
+            return super().data
+        finally:
+            metrics.serializer_time += time.perf_counter() - start
+
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    pass
+
+
+class RequestInstrumentationMiddleware:
+    def __init__(self, get_response):
+        if not settings.REQUEST_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.duplicate_threshold = settings.DUPLICATE_QUERY_THRESHOLD
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+
+        duration = time.perf_counter() - metrics.start
+        response['Server-Timing'] = ', '.join([
+            f'total;dur={duration * 1000:.1f}',
+            f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.query_count} queries"',
+            f'serialize;dur={metrics.serializer_time * 1000:.1f}',
+        ])
+
+        match = request.resolver_match
+        view = match.view_name if match else None
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': view,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'db_ms': round(metrics.db_time * 1000, 2),
+            'queries': metrics.query_count,
+            'serialize_ms': round(metrics.serializer_time * 1000, 2),
+            'bytes': None if response.streaming else len(response.content),
+        }
+        logger.info(json.dumps(record))
+
+        duplicates = metrics.duplicate_queries(self.duplicate_threshold)
+        if duplicates:
+            logger.warning(json.dumps({
+                'event': 'duplicate_queries',
+                'method': request.method,
+                'path': request.path,
+                'view': view,
+                'queries': [{'sql': sql, 'count': count} for sql, count in duplicates],
+            }))
+        return response
@@ -0,0 +1,212 @@
+"""Database-backed background jobs, run by ``manage.py run_worker``.
+
+Functions decorated with ``@task`` are queued with ``some_task.enqueue(**payload)``,
+which inserts a Job row in the current transaction: workers only see the
+job once the data it refers to is committed, and a rollback discards it.
+The payload must be JSON serializable.
+
+A worker claims a job (see ``JobQuerySet.claim``), calls the task with the
+payload and marks the job done. Exceptions are retried with exponential
+backoff until the task's ``max_attempts`` are used up, then the job is
+marked failed and can be retried from the admin. A claimed job stays
+invisible to other workers for JOB_TIMEOUT seconds, and a ``Heartbeat``
+thread renews that lock while the task runs, so long tasks are not taken
+over. If its worker dies (or cannot reach the database for JOB_TIMEOUT
+seconds), another worker picks the job up once the lock expires. Tasks may
+therefore run more than once and should be idempotent.
+
+With JOBS_RUN_INLINE, jobs run in the enqueuing process right after the
+transaction commits (once, without delay or retries), so local
+development works without a worker.
+"""
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, OperationalError, close_old_connections, connections, transaction
+from django.utils import timezone
+
+from .metrics import JOBS
+from .models import Job
+
+
+logger = logging.getLogger(__name__)
+
+# Registered tasks by name; filled in as products.tasks is imported
+TASKS = {}
+
+
+class Task:
+    def __init__(self, function, max_attempts=None, retry_delay=30):
+        self.function = function
+        self.name = f'{function.__module__}.{function.__qualname__}'
+        self.max_attempts = max_attempts
+        # Seconds before the first retry, doubled for each further one
+        self.retry_delay = retry_delay
+        self.__doc__ = function.__doc__
+
+    def __call__(self, **payload):
+        return self.function(**payload)
+
+    def __repr__(self):
+        return f'<Task {self.name}>'
+
+    def enqueue(self, delay=0, unique=False, **payload):
+        """Queue a run with ``payload``; with ``unique``, not if an identical job is still queued."""
+        if settings.JOBS_RUN_INLINE:
+            delay = 0
+        elif unique and Job.objects.filter(task=self.name, status='queued', payload=payload).exists():
+            return None
+        job = Job.objects.create(
+            task=self.name,
+            payload=payload,
+            max_attempts=self.max_attempts or settings.JOB_MAX_ATTEMPTS,
+            run_at=timezone.now() + timedelta(seconds=delay),
+        )
+        if settings.JOBS_RUN_INLINE:
+            transaction.on_commit(lambda: run_next(f'inline:{os.getpid()}', pk=job.pk))
+        return job
+
+
+def task(function=None, *, max_attempts=None, retry_delay=30):
+    """Register a function as a background task; usable with or without arguments"""
+    def register(function):
+        registered = Task(function, max_attempts, retry_delay)
+        TASKS[registered.name] = registered
+        return registered
+    return register(function) if function is not None else register
+
+
+class Heartbeat(threading.Thread):
+    """Renews a claimed job's lock every ``timeout / 3`` seconds while used as a context manager"""
+
+    def __init__(self, job, worker, timeout):
+        super().__init__(name=f'heartbeat-{job.pk}', daemon=True)
+        self.job = job
+        self.worker = worker
+        self.timeout = timeout
+        self.stopped = threading.Event()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.join()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.timeout / 3):
+                try:
+                    renewed = self.job.renew(self.worker, self.timeout)
+                except DatabaseError as error:
+                    # The next beat tries again; the lock lasts another two intervals
+                    logger.warning('Could not renew job %s: %s', self.job.pk, error)
+                    continue
+                if not renewed:
+                    logger.warning('Job %s (%s) was taken over by another worker', self.job.pk, self.job.task)
+                    break
+        finally:
+            # This thread's own connection
+            connections.close_all()
+
+
+def run_next(worker, pk=None):
+    """Claim and run one available job (or job ``pk``); False if there was none."""
+    job = Job.objects.claim(worker, settings.JOB_TIMEOUT, pk=pk)
+    if job is None:
+        return False
+
+    registered = TASKS.get(job.task)
+    if registered is None:
+        job.finish(worker, 'failed', f'Unknown task {job.task}')
+        logger.error('Job %s has an unknown task %s', job.pk, job.task)
+        JOBS.inc(task=job.task, result='failed')
+        return True
+    if job.attempts > job.max_attempts:
+        # Taken over after its worker died during the last attempt
+        job.finish(worker, 'failed', job.last_error or 'Worker stopped during the last attempt')
+        logger.error('Job %s (%s) timed out on its last attempt', job.pk, job.task)
+        JOBS.inc(task=job.task, result='failed')
+        return True
+
+    start = time.perf_counter()
+    try:
+        with Heartbeat(job, worker, settings.JOB_TIMEOUT):
+            registered(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            retry_at = timezone.now() + timedelta(seconds=registered.retry_delay * 2 ** (job.attempts - 1))
+            job.finish(worker, 'queued', error, retry_at=retry_at)
+            logger.warning('Job %s (%s) failed, attempt %s of %s', job.pk, job.task, job.attempts, job.max_attempts)
+            JOBS.inc(task=job.task, result='retried')
+        else:
+            job.finish(worker, 'failed', error)
+            logger.error('Job %s (%s) failed after %s attempts\n%s', job.pk, job.task, job.attempts, error)
+            JOBS.inc(task=job.task, result='failed')
+    else:
+        job.finish(worker, 'done')
+        logger.info('Job %s (%s) done in %.3fs', job.pk, job.task, time.perf_counter() - start)
+        JOBS.inc(task=job.task, result='done')
+    return True
+
+
+def prune_jobs():
+    """Delete done jobs older than JOB_RETENTION_DAYS; failed jobs are kept for inspection"""
+    cutoff = timezone.now() - timedelta(days=settings.JOB_RETENTION_DAYS)
+    deleted, _ = Job.objects.filter(status='done', finished_at__lt=cutoff).delete()
+    return deleted
+
+
+class Worker:
+    """Runs jobs one at a time until stopped; SIGTERM or SIGINT finish the current job first."""
+
+    # Seconds between prune_jobs() calls
+    prune_interval = 3600
+
+    def __init__(self, poll_interval=1.0, burst=False):
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self.poll_interval = poll_interval
+        # Exit once no job is available instead of polling
+        self.burst = burst
+        self.stopping = False
+        self.last_prune = 0
+
+    def stop(self, signum=None, frame=None):
+        self.stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        logger.info('Worker %s started', self.name)
+        while not self.stopping:
+            # Like a request: drop connections that are broken or past CONN_MAX_AGE
+            close_old_connections()
+            try:
+                ran = run_next(self.name)
+            except OperationalError as error:
+                # e.g. "database is locked" while SQLite workers contend for writes
+                logger.warning('Worker %s could not claim a job: %s', self.name, error)
+                time.sleep(self.poll_interval)
+                continue
+            if ran:
+                continue
+            if self.burst:
+                break
+            if time.monotonic() - self.last_prune > self.prune_interval:
+                self.last_prune = time.monotonic()
+                try:
+                    prune_jobs()
+                except OperationalError as error:
+                    logger.warning('Worker %s could not prune jobs: %s', self.name, error)
+            time.sleep(self.poll_interval)
+        connections.close_all()
+        logger.info('Worker %s stopped', self.name)
@@ -0,0 +1,70 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import TruncDate
+
+from products.analytics import refresh_days, sale_date
+from products.models import DailyOrderTotals, Order
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily sales rollups from the orders, a few days per transaction'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=datetime.date.fromisoformat, help='First day (YYYY-MM-DD); defaults to the first order')
+        parser.add_argument('--end', type=datetime.date.fromisoformat, help='Last day (YYYY-MM-DD); defaults to the last order')
+        parser.add_argument('--chunk-days', type=int, default=7, help='Days recomputed per transaction')
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only compare the rollup order counts and revenue per day with the orders'
+        )
+
+    def handle(self, *args, **options):
+        bounds = Order.objects.aggregate(first=Min('created_at'), last=Max('created_at'))
+        if bounds['first'] is None:
+            self.stdout.write('No orders')
+            return
+        start = options['start'] or sale_date(bounds['first'])
+        end = options['end'] or sale_date(bounds['last'])
+        if start > end:
+            raise CommandError('--start is after --end')
+        if options['check']:
+            return self.check_rollups(start, end)
+
+        begin = time.perf_counter()
+        rows = 0
+        chunk_start = start
+        while chunk_start <= end:
+            chunk_end = min(chunk_start + datetime.timedelta(days=options['chunk_days'] - 1), end)
+            rows += refresh_days(chunk_start, chunk_end)
+            elapsed = time.perf_counter() - begin
+            self.stdout.write(f'{chunk_start} .. {chunk_end}: {rows} rollup rows in {elapsed:.1f}s')
+            chunk_start = chunk_end + datetime.timedelta(days=1)
+
+        days = (end - start).days + 1
+        elapsed = time.perf_counter() - begin
+        self.stdout.write(self.style.SUCCESS(f'{days} days, {rows} rows in {elapsed:.1f}s ({days / elapsed:.0f} days/s)'))
+
+    def check_rollups(self, start, end):
+        def totals(queryset, date, orders, revenue):
+            return {
+                row['day']: (row['orders'], row['revenue'])
+                for row in queryset.values(day=date).annotate(orders=orders, revenue=revenue).order_by()
+            }
+
+        expected = totals(
+            Order.objects.filter(created_at__date__range=(start, end)),
+            TruncDate('created_at'), Count('pk'), Sum('total_amount'),
+        )
+        actual = totals(
+            DailyOrderTotals.objects.filter(date__range=(start, end)).exclude(orders=0),
+            F('date'), Sum('orders'), Sum('revenue'),
+        )
+        mismatches = sorted(day for day in expected.keys() | actual.keys() if expected.get(day) != actual.get(day))
+        for day in mismatches[:20]:
+            self.stdout.write(f'{day}: orders {expected.get(day)} vs rollup {actual.get(day)}')
+        if mismatches:
+            raise CommandError(f'{len(mismatches)} days differ; run backfill_sales_rollups for them')
+        self.stdout.write(self.style.SUCCESS(f'{len(expected)} days match'))
@@ -0,0 +1,219 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from products.datagen import generate_categories, generate_customers, generate_orders, generate_products
+from products.models import Category, Customer, Order, Product
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = 'Measure latency percentiles, throughput and query counts for every product, category and order endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--products', type=int, default=0,
+            help='Generate a temporary dataset with this many products (rolled back afterwards). '
+                 'With 0, benchmark the existing data, e.g. from generate_catalog.'
+        )
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--orders', type=int, default=5000, help='Orders to generate along with --products')
+        parser.add_argument('--seed', default='benchmark')
+        parser.add_argument('--repeat', type=int, default=50, help='Timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per endpoint')
+        parser.add_argument('--only', help='Only run endpoints whose name contains this text')
+        parser.add_argument(
+            '--cache', action='store_true',
+            help='Keep the configured cache; by default responses are measured uncached'
+        )
+        parser.add_argument('--json', metavar='PATH', help="Write results as JSON ('-' for stdout)")
+        parser.add_argument('--compare', metavar='PATH', help='Print changes against an earlier --json result')
+
+    def handle(self, *args, **options):
+        baseline = self.load_baseline(options['compare'])
+        cache_settings = {} if options['cache'] else {
+            'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        }
+        # Order creation reserves stock, and generated data is temporary, so
+        # everything is rolled back. Without DEBUG every plain-HTTP request
+        # would be a 301 to HTTPS.
+        with transaction.atomic(), override_settings(ALLOWED_HOSTS=['*'], SECURE_SSL_REDIRECT=False, **cache_settings):
+            if options['products']:
+                self.generate_dataset(options)
+            client, cases = self.get_cases()
+            results = []
+            self.stdout.write(
+                f'{"endpoint":<28} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"req/s":>8} {"queries":>8} {"bytes":>9}'
+            )
+            for name, method, path, data in cases:
+                if options['only'] and options['only'] not in name:
+                    continue
+                result = self.benchmark(client, name, method, path, data, options)
+                results.append(result)
+                self.report(result, baseline.get(name))
+            meta = self.get_meta(options)
+            transaction.set_rollback(True)
+
+        if options['json']:
+            output = json.dumps({'meta': meta, 'results': results}, indent=2)
+            if options['json'] == '-':
+                self.stdout.write(output)
+            else:
+                with open(options['json'], 'w') as file:
+                    file.write(output + '\n')
+
+    def generate_dataset(self, options):
+        self.stdout.write(f'Generating {options["products"]} products and {options["orders"]} orders...')
+        categories = generate_categories(options['categories'], seed=options['seed'])
+        generate_products(options['products'], categories, seed=options['seed'])
+        customer_ids = generate_customers(max(1, options['orders'] // 50), seed=options['seed'])
+        generate_orders(options['orders'], customer_ids, seed=options['seed'])
+
+    def get_cases(self):
+        """An authenticated client and (name, method, path, data) for each endpoint"""
+        category = Category.objects.filter(is_active=True).order_by('pk').first()
+        product = Product.objects.filter(is_active=True).order_by('-created_at').first()
+        order = Order.objects.order_by('-pk').first()
+        if product is None or order is None:
+            raise CommandError('No products or orders to benchmark; run generate_catalog or pass --products')
+        customer = Customer.objects.select_related('user').get(pk=order.customer_id)
+        client = APIClient()
+        client.force_authenticate(customer.user)
+
+        basket = list(
+            Product.objects.filter(is_active=True, is_custom_order=False).order_by('pk').values_list('pk', flat=True)[:3]
+        )
+        # Enough stock that every timed checkout's reservation succeeds
+        Product.objects.filter(pk__in=basket).update(stock_quantity=1000000)
+        checkout = {
+            'shipping_address': '1 Benchmark Road',
+            'shipping_city': 'Lagos',
+            'shipping_country': 'Nigeria',
+            'shipping_postal_code': '100001',
+            'items': [{'product': product_id, 'quantity': 1, 'size': 'M'} for product_id in basket],
+        }
+
+        products = '/api/products/'
+        return client, [
+            ('products', 'get', products, {}),
+            ('products category', 'get', products, {'category': category.pk}),
+            ('products style', 'get', products, {'style': 'kente'}),
+            ('products price range', 'get', products, {'min_price': '5000', 'max_price': '20000'}),
+            ('products in stock', 'get', products, {'in_stock': 'true'}),
+            ('products featured filter', 'get', products, {'is_featured': 'true'}),
+            ('products custom order', 'get', products, {'is_custom_order': 'true'}),
+            ('products search', 'get', products, {'search': 'kente'}),
+            ('products order price', 'get', products, {'ordering': 'price'}),
+            ('products order -price', 'get', products, {'ordering': '-price'}),
+            ('products order title', 'get', products, {'ordering': 'title'}),
+            ('products order created', 'get', products, {'ordering': 'created_at'}),
+            ('products page 50', 'get', products, {'page': 50}),
+            ('products cursor', 'get', products, {'pagination': 'cursor'}),
+            ('product detail', 'get', f'{products}{product.pk}/', {}),
+            ('products featured', 'get', f'{products}featured/', {}),
+            ('products african_styles', 'get', f'{products}african_styles/', {}),
+            ('products by_category', 'get', f'{products}by_category/', {}),
+            ('products facets', 'get', f'{products}facets/', {}),
+            ('categories', 'get', '/api/categories/', {}),
+            ('category detail', 'get', f'/api/categories/{category.pk}/', {}),
+            ('orders', 'get', '/api/orders/', {}),
+            ('order detail', 'get', f'/api/orders/{order.pk}/', {}),
+            ('order create', 'post', '/api/orders/', checkout),
+        ]
+
+    def benchmark(self, client, name, method, path, data, options):
+        def request():
+            if method == 'post':
+                return client.post(path, data, format='json')
+            return client.get(path, data)
+
+        def check(response):
+            # Redirects and errors would be timed instead of the endpoint
+            if not 200 <= response.status_code < 300:
+                raise CommandError(f'{name}: {response.status_code} {response.content[:200]}')
+
+        for _ in range(options['warmup']):
+            check(request())
+
+        timings, query_counts = [], []
+        start = time.perf_counter()
+        for _ in range(options['repeat']):
+            with CaptureQueriesContext(connection) as queries:
+                request_start = time.perf_counter()
+                response = request()
+                timings.append(time.perf_counter() - request_start)
+            query_counts.append(len(queries))
+            check(response)
+        elapsed = time.perf_counter() - start
+
+        timings.sort()
+        return {
+            'name': name,
+            'method': method.upper(),
+            'path': path,
+            'params': data if method == 'get' else None,
+            'status': response.status_code,
+            'requests': len(timings),
+            'p50_ms': round(statistics.median(timings) * 1000, 3),
+            'p90_ms': round(percentile(timings, 0.90) * 1000, 3),
+            'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(timings, 0.99) * 1000, 3),
+            'mean_ms': round(statistics.mean(timings) * 1000, 3),
+            'max_ms': round(timings[-1] * 1000, 3),
+            'requests_per_second': round(len(timings) / elapsed, 1),
+            'queries': max(query_counts),
+            'response_bytes': len(response.content),
+        }
+
+    def report(self, result, baseline):
+        self.stdout.write(
+            f'{result["name"]:<28} {result["p50_ms"]:>8.2f} {result["p95_ms"]:>8.2f} {result["p99_ms"]:>8.2f} '
+            f'{result["requests_per_second"]:>8.0f} {result["queries"]:>8} {result["response_bytes"]:>9}'
+        )
+        if baseline:
+            change = (result['p50_ms'] - baseline['p50_ms']) / baseline['p50_ms'] * 100
+            line = f'{"":<28} p50 {change:+.0f}% vs {baseline["p50_ms"]:.2f}ms'
+            if result['queries'] != baseline['queries']:
+                line += f', queries {baseline["queries"]} -> {result["queries"]}'
+            style = self.style.ERROR if change > 10 or result['queries'] > baseline['queries'] else self.style.SUCCESS
+            self.stdout.write(style(line))
+
+    def load_baseline(self, path):
+        if not path:
+            return {}
+        try:
+            with open(path) as file:
+                return {result['name']: result for result in json.load(file)['results']}
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f'Cannot read baseline {path}: {error}')
+
+    def get_meta(self, options):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'timestamp': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'cache': options['cache'],
+            'products': Product.objects.count(),
+            'orders': Order.objects.count(),
+        }
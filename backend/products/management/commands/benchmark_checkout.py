@@ -0,0 +1,62 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from products.datagen import generate_categories, generate_products
+from products.models import Customer, Product
+
+
+class Command(BaseCommand):
+    help = 'Measure POST /api/orders/ latency and query counts for different basket sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', default='1,10,100', help='Comma-separated line item counts')
+        parser.add_argument('--repeat', type=int, default=20, help='Checkouts per basket size')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['items'].split(',')]
+
+        # Everything created here, orders included, is rolled back. Without
+        # DEBUG every plain-HTTP request would be a 301 to HTTPS.
+        with transaction.atomic(), override_settings(ALLOWED_HOSTS=['*'], SECURE_SSL_REDIRECT=False):
+            generate_products(max(sizes) * 2, generate_categories(1, seed='checkout'), seed='checkout')
+            products = Product.objects.filter(slug__startswith='generated-product-checkout-', is_active=True)
+            # Enough stock that every checkout's reservation succeeds
+            products.update(stock_quantity=1000000)
+            products = list(products.values_list('pk', flat=True))
+            user = User.objects.create_user('benchmark-checkout')
+            Customer.objects.create(user=user)
+            client = APIClient()
+            client.force_authenticate(user)
+
+            self.stdout.write(f'{"items":>6} {"median ms":>10} {"p95 ms":>10} {"queries":>8}')
+            for size in sizes:
+                payload = {
+                    'shipping_address': '1 Benchmark Road',
+                    'shipping_city': 'Lagos',
+                    'shipping_country': 'Nigeria',
+                    'shipping_postal_code': '100001',
+                    'items': [
+                        {'product': product_id, 'quantity': 2, 'size': 'M', 'color': 'Gold'}
+                        for product_id in products[:size]
+                    ],
+                }
+                timings = []
+                for _ in range(options['repeat']):
+                    with CaptureQueriesContext(connection) as queries:
+                        start = time.perf_counter()
+                        response = client.post('/api/orders/', payload, format='json')
+                        timings.append(time.perf_counter() - start)
+                    if response.status_code != 201:
+                        raise CommandError(f'Checkout failed: {response.status_code} {response.content[:200]}')
+                timings.sort()
+                p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                self.stdout.write(
+                    f'{size:>6} {statistics.median(timings) * 1000:>10.2f} {p95 * 1000:>10.2f} {len(queries):>8}'
+                )
+            transaction.set_rollback(True)
@@ -0,0 +1,82 @@
+import random
+import shutil
+import tempfile
+import time
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from PIL import Image, ImageFilter
+
+from products.datagen import generate_categories, generate_products
+from products.images import process_instance
+from products.models import Product
+
+
+def photo(rng, width, height):
+    """A JPEG with photo-like texture, so compression ratios are realistic"""
+    image = Image.effect_noise((width // 16, height // 16), 48).convert('RGB')
+    tint = Image.new('RGB', image.size, tuple(rng.randrange(256) for _ in range(3)))
+    image = Image.blend(image, tint, 0.6).resize((width, height), Image.BICUBIC)
+    image = image.filter(ImageFilter.GaussianBlur(2))
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = 'Compare image bytes per product list page before and after resized WebP/JPEG derivatives'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--width', type=int, default=2400, help='Width of the generated uploads')
+        parser.add_argument('--height', type=int, default=1600)
+        parser.add_argument(
+            '--display-width', type=int, default=640,
+            help='CSS pixels x device pixel ratio of a list thumbnail; picks the srcset candidate'
+        )
+
+    def handle(self, *args, **options):
+        media_root = tempfile.mkdtemp(prefix='benchmark-images-')
+        rng = random.Random(0)
+        try:
+            with transaction.atomic(), override_settings(MEDIA_ROOT=media_root):
+                generate_products(options['page_size'], generate_categories(1, seed='images'), seed='images')
+                products = list(Product.objects.filter(slug__startswith='generated-product-images-'))
+                for product in products:
+                    product.primary_image.save(
+                        f'{product.slug}.jpg', ContentFile(photo(rng, options['width'], options['height'])),
+                        save=False,
+                    )
+                    Product.objects.filter(pk=product.pk).update(primary_image=product.primary_image.name)
+
+                start = time.perf_counter()
+                for product in products:
+                    process_instance(Product, product.pk)
+                elapsed = time.perf_counter() - start
+
+                before = after_webp = after_jpeg = 0
+                for product in Product.objects.filter(pk__in=[product.pk for product in products]):
+                    before += product.primary_image.size
+                    derivatives = product.image_derivatives[product.primary_image.name]['derivatives']
+                    after_webp += self.pick(derivatives, 'webp', options['display_width'])
+                    after_jpeg += self.pick(derivatives, 'jpeg', options['display_width'])
+                transaction.set_rollback(True)
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        self.stdout.write(
+            f'{len(products)} products, {options["width"]}x{options["height"]} uploads, '
+            f'derivatives generated in {elapsed / len(products) * 1000:.0f} ms per image'
+        )
+        self.stdout.write(f'{"image bytes per list page":<32} {"bytes":>12} {"vs original":>12}')
+        for label, size in [('original uploads', before), ('WebP srcset', after_webp), ('JPEG srcset', after_jpeg)]:
+            self.stdout.write(f'{label:<32} {size:>12,} {size / before:>11.1%}')
+
+    def pick(self, derivatives, format, display_width):
+        """Bytes of the candidate a browser picks: the narrowest at least display_width wide"""
+        candidates = sorted((d for d in derivatives if d['format'] == format), key=lambda d: d['width'])
+        chosen = next((d for d in candidates if d['width'] >= display_width), candidates[-1])
+        return chosen['bytes']
@@ -0,0 +1,119 @@
+import datetime
+import io
+import json
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils.translation import gettext_lazy
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+
+from products.datagen import generate_categories, generate_products
+from products.renderers import FastJSONParser, FastJSONRenderer, orjson
+
+
+def edge_cases():
+    """Values whose encoding the fast renderer must reproduce exactly"""
+    utc = datetime.datetime(2024, 5, 1, 12, 30, 45, 123456, tzinfo=datetime.timezone.utc)
+    return ReturnDict({
+        'decimals': [Decimal('12500.00'), Decimal('0.10'), Decimal('-3'), Decimal('1234567.891')],
+        'utc': utc,
+        'offset': utc.astimezone(datetime.timezone(datetime.timedelta(hours=1))),
+        'naive': utc.replace(tzinfo=None, microsecond=0),
+        'date': utc.date(),
+        'time': datetime.time(9, 15, 0, 500),
+        'duration': datetime.timedelta(days=1, seconds=5),
+        'lazy': gettext_lazy('Kente'),
+        'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        'text': 'Adìre   line   "quoted" </script> \U0001F9F6',
+        'numbers': [0, -1, 2 ** 53, 0.1, 2.5, -0.0, 12345.678],
+        'flags': [True, False, None],
+        'tuple': (1, 'a'),
+        'nested': ReturnList([{'colors_available': ['Gold', 'Royal Blue'], 'image_gallery': []}], serializer=None),
+    }, serializer=None)
+
+
+class Command(BaseCommand):
+    help = 'Check FastJSONRenderer/FastJSONParser against the stock DRF JSON classes and compare their speed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--products', type=int, default=2000,
+            help='Size of the temporary generated catalog (rolled back afterwards)'
+        )
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per payload')
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed; FastJSONRenderer uses the stdlib encoder'))
+
+        # Without DEBUG every plain-HTTP request would be a 301 to HTTPS
+        with transaction.atomic(), override_settings(ALLOWED_HOSTS=['*'], SECURE_SSL_REDIRECT=False):
+            generate_products(options['products'], generate_categories(20, seed='json'), seed='json')
+            client = APIClient()
+            products = self.get_data(client, '/api/products/')
+            payloads = {
+                'edge cases': edge_cases(),
+                # Integers over 64 bits and non-string keys fall back to the stdlib encoder
+                'fallback': {'big': 2 ** 70, 'keys': {1: 'one'}},
+                'product list page': products,
+                'featured': self.get_data(client, '/api/products/featured/'),
+                'by_category': self.get_data(client, '/api/products/by_category/'),
+                'product details': [
+                    self.get_data(client, f'/api/products/{product["id"]}/') for product in products['results']
+                ],
+            }
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'{"render":<20} {"bytes":>9} {"stdlib ms":>10} {"fast ms":>10} {"speedup":>8}')
+        for name, data in payloads.items():
+            expected = JSONRenderer().render(data)
+            actual = FastJSONRenderer().render(data)
+            if actual != expected:
+                raise CommandError(f'{name}: FastJSONRenderer output differs from JSONRenderer')
+            self.compare(name, len(expected), JSONRenderer().render, FastJSONRenderer().render, data, options)
+
+        order = json.dumps({
+            'shipping_address': '1 Benchmark Road', 'shipping_city': 'Lagos',
+            'shipping_country': 'Nigeria', 'shipping_postal_code': '100001',
+            'items': [
+                {'product': index, 'quantity': 2, 'size': 'M', 'color': 'Gold',
+                 'custom_measurements': {'bust': 36.5, 'waist': 30}, 'custom_notes': 'Adìre  '}
+                for index in range(100)
+            ],
+        }).encode()
+        if FastJSONParser().parse(io.BytesIO(order)) != JSONParser().parse(io.BytesIO(order)):
+            raise CommandError('FastJSONParser result differs from JSONParser')
+        self.stdout.write(f'\n{"parse":<20} {"bytes":>9} {"stdlib ms":>10} {"fast ms":>10} {"speedup":>8}')
+        self.compare(
+            'order, 100 items', len(order),
+            lambda body: JSONParser().parse(io.BytesIO(body)),
+            lambda body: FastJSONParser().parse(io.BytesIO(body)),
+            order, options,
+        )
+
+    def get_data(self, client, path):
+        """The serialized data of a successful GET, before rendering"""
+        response = client.get(path)
+        if response.status_code != 200:
+            raise CommandError(f'{path}: {response.status_code} {response.content[:200]}')
+        return response.data
+
+    def compare(self, name, size, stdlib, fast, data, options):
+        timings = []
+        for function in (stdlib, fast):
+            runs = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                function(data)
+                runs.append(time.perf_counter() - start)
+            timings.append(min(runs) * 1000)
+        self.stdout.write(
+            f'{name:<20} {size:>9} {timings[0]:>10.3f} {timings[1]:>10.3f} {timings[0] / timings[1]:>7.1f}x'
+        )
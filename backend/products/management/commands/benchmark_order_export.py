@@ -0,0 +1,63 @@
+import json
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.paginator import Paginator
+from django.db.models import Prefetch
+from django.test.utils import override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework.utils.encoders import JSONEncoder
+
+from products.models import Order, OrderItem
+from products.order_export import export_rows, stream_export
+from products.serializers import OrderSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare order export throughput and peak memory: paging through OrderSerializer vs streaming CSV/JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=5000, help='Most recent orders to export')
+        parser.add_argument('--page-size', type=int, default=100, help='Orders per OrderSerializer page')
+
+    def handle(self, *args, **options):
+        ids = list(Order.objects.order_by('-pk').values_list('pk', flat=True)[:options['orders']])
+        if not ids:
+            raise CommandError('No orders; run generate_catalog first')
+        orders = Order.objects.filter(pk__in=ids)
+        items = OrderItem.objects.filter(order__in=ids).count()
+        context = {'request': Request(APIRequestFactory().get('/api/orders/'))}
+
+        def serializer_pages():
+            queryset = orders.select_related('customer__user').prefetch_related(
+                Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+            ).order_by('pk')
+            paginator = Paginator(queryset, options['page_size'])
+            for number in paginator.page_range:
+                data = OrderSerializer(paginator.page(number).object_list, many=True, context=context).data
+                yield json.dumps(data, cls=JSONEncoder)
+
+        runs = [
+            (f'OrderSerializer, {options["page_size"]}/page', serializer_pages),
+            ('streaming CSV', lambda: stream_export(export_rows(orders), 'csv')),
+            ('streaming JSONL', lambda: stream_export(export_rows(orders), 'jsonl')),
+        ]
+        self.stdout.write(f'{len(ids)} orders, {items} order items')
+        self.stdout.write(f'{"export":<28} {"rows/s":>10} {"MB/s":>8} {"MB":>8} {"peak MB":>9}')
+        with override_settings(ALLOWED_HOSTS=['*']):
+            for label, export in runs:
+                start = time.perf_counter()
+                size = sum(len(chunk.encode()) for chunk in export())
+                elapsed = time.perf_counter() - start
+                # Separate pass, as tracing allocations slows everything down
+                tracemalloc.start()
+                for chunk in export():
+                    pass
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                self.stdout.write(
+                    f'{label:<28} {items / elapsed:>10.0f} {size / elapsed / 1e6:>8.1f} '
+                    f'{size / 1e6:>8.1f} {peak / 1e6:>9.1f}'
+                )
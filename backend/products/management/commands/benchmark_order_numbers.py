@@ -0,0 +1,99 @@
+import threading
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, connection
+
+from products.models import Customer, Order
+from products.order_numbers import generate_order_number
+
+
+def legacy_order_number():
+    """The previous scheme: 32 random bits, scattered across the unique index"""
+    return f"FC{uuid.uuid4().hex[:8].upper()}"
+
+
+SCHEMES = {
+    'legacy': legacy_order_number,
+    'time-ordered': generate_order_number,
+}
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent order insert throughput for the legacy and time-ordered order numbers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--orders', type=int, default=500, help='Orders inserted per thread')
+        parser.add_argument(
+            '--prefill', type=int, default=50000,
+            help='Orders to insert up front so the unique index is realistically large'
+        )
+
+    def handle(self, *args, **options):
+        # Writer threads use their own connections, so this data is committed
+        # and deleted afterwards rather than rolled back
+        user = User.objects.create_user(f'benchmark-order-numbers-{uuid.uuid4().hex[:8]}')
+        customer = Customer.objects.create(user=user)
+        try:
+            for name, scheme in SCHEMES.items():
+                self.prefill(customer, scheme, options['prefill'])
+                elapsed, collisions = self.run_writers(customer, scheme, options['threads'], options['orders'])
+                total = options['threads'] * options['orders']
+                self.stdout.write(
+                    f'{name:<13} {total / elapsed:>9.0f} orders/s  '
+                    f'({total} orders, {options["threads"]} threads, {collisions} collisions)'
+                )
+                self.delete_orders(customer)
+        finally:
+            self.delete_orders(customer)
+            user.delete()
+
+    def delete_orders(self, customer):
+        """Drop the benchmark orders in one statement.
+
+        They never reached the sales rollups, so Order's delete signal (which
+        subtracts from them) must not run, and they have no items to cascade to.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {Order._meta.db_table} WHERE customer_id = %s', [customer.pk])
+
+    def make_order(self, customer, order_number):
+        return Order(
+            customer=customer, order_number=order_number, subtotal=0, total_amount=0,
+            shipping_address='-', shipping_city='-', shipping_country='-', shipping_postal_code='-',
+        )
+
+    def prefill(self, customer, scheme, count):
+        batch = []
+        for _ in range(count):
+            batch.append(self.make_order(customer, scheme()))
+            if len(batch) == 1000:
+                Order.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        Order.objects.bulk_create(batch, ignore_conflicts=True)
+
+    def run_writers(self, customer, scheme, thread_count, orders_per_thread):
+        collisions = []
+
+        def writer():
+            try:
+                for _ in range(orders_per_thread):
+                    while True:
+                        try:
+                            self.make_order(customer, scheme()).save()
+                            break
+                        except IntegrityError:
+                            collisions.append(1)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=writer) for _ in range(thread_count)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start, len(collisions)
@@ -0,0 +1,95 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from products.datagen import generate_categories, generate_products
+from products.models import Category
+from products.views import ProductViewSet
+
+
+class Command(BaseCommand):
+    help = 'Print EXPLAIN plans and timings for each ProductViewSet filter combination'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--products', type=int, default=0,
+            help='Generate a temporary catalog of this many products (rolled back afterwards). '
+                 'With 0, benchmark the existing data.'
+        )
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--no-explain', action='store_true', help='Only print timings')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['products']:
+                self.generate_catalog(options['products'], options['categories'], options['seed'])
+            self.analyze()
+            category = Category.objects.filter(is_active=True).first()
+            for label, params in self.get_cases(category):
+                self.benchmark(label, params, options)
+            # Never keep the generated catalog
+            transaction.set_rollback(True)
+
+    def get_cases(self, category):
+        cases = [
+            ('default listing', {}),
+            ('style', {'style': 'kente'}),
+            ('price range', {'min_price': '5000', 'max_price': '20000'}),
+            ('featured', {'is_featured': 'true'}),
+            ('in stock', {'in_stock': 'true'}),
+            ('order by price', {'ordering': 'price'}),
+            ('style + in stock + price', {'style': 'ankara', 'in_stock': 'true', 'max_price': '30000'}),
+        ]
+        if category is not None:
+            cases.insert(1, ('category', {'category': str(category.pk)}))
+        return cases
+
+    def get_queryset(self, params):
+        """Build the queryset exactly as ProductViewSet.list would"""
+        view = ProductViewSet()
+        view.action = 'list'
+        view.format_kwarg = None
+        view.request = Request(APIRequestFactory().get('/api/products/', params))
+        view.request.parsers = []
+        return view.filter_queryset(view.get_queryset())
+
+    def benchmark(self, label, params, options):
+        queryset = self.get_queryset(params)
+        page = queryset[:20]
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{label} {params or ""}'))
+        if not options['no_explain']:
+            self.stdout.write(page.explain())
+
+        count_times, page_times = [], []
+        for _ in range(options['repeat']):
+            start = time.perf_counter()
+            total = queryset.count()
+            count_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            list(page.all())
+            page_times.append(time.perf_counter() - start)
+
+        self.stdout.write(
+            f'rows={total} '
+            f'count median={statistics.median(count_times) * 1000:.2f}ms '
+            f'page median={statistics.median(page_times) * 1000:.2f}ms '
+            f'page max={max(page_times) * 1000:.2f}ms\n'
+        )
+
+    def analyze(self):
+        # Refresh planner statistics so EXPLAIN reflects the current data
+        if connection.vendor in ('sqlite', 'postgresql'):
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+    def generate_catalog(self, size, category_count, seed):
+        self.stdout.write(f'Generating {size} products in {category_count} categories...')
+        categories = generate_categories(category_count, seed)
+        generate_products(size, categories, seed)
@@ -0,0 +1,63 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from products.datagen import generate_categories, generate_products
+from products.views import ProductViewSet
+
+
+class Command(BaseCommand):
+    help = 'Compare icontains and full-text product search latency as the catalog grows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', default='1000,10000,50000',
+            help='Comma-separated catalog sizes to measure (generated, then rolled back)'
+        )
+        parser.add_argument('--queries', default='kente,royal dress,cotton wrap,yoruba')
+        parser.add_argument('--repeat', type=int, default=10, help='Timed runs per query')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        queries = options['queries'].split(',')
+
+        self.stdout.write(f'{"products":>10} {"query":<16} {"icontains ms":>13} {"full-text ms":>13} {"speedup":>8}')
+        with transaction.atomic():
+            categories = generate_categories(20, options['seed'])
+            generated = 0
+            for size in sizes:
+                generate_products(size - generated, categories, options['seed'], start=generated)
+                generated = size
+                for query in queries:
+                    with override_settings(PRODUCT_SEARCH_BACKEND='icontains'):
+                        baseline = self.time_search(query, options['repeat'])
+                    full_text = self.time_search(query, options['repeat'])
+                    self.stdout.write(
+                        f'{size:>10} {query:<16} {baseline * 1000:>13.2f} {full_text * 1000:>13.2f} '
+                        f'{baseline / full_text:>7.1f}x'
+                    )
+            # Never keep the generated catalog
+            transaction.set_rollback(True)
+
+    def time_search(self, query, repeat):
+        """Median time to count the matches and fetch the first page"""
+        view = ProductViewSet()
+        view.action = 'list'
+        view.format_kwarg = None
+        view.request = Request(APIRequestFactory().get('/api/products/', {'search': query}))
+        view.request.parsers = []
+
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            queryset = view.filter_queryset(view.get_queryset())
+            queryset.count()
+            list(queryset[:20])
+            timings.append(time.perf_counter() - start)
+        return statistics.median(timings)
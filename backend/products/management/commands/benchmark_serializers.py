@@ -0,0 +1,68 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework.utils.encoders import JSONEncoder
+
+from products.datagen import generate_categories, generate_products
+from products.models import Product
+from products.serializers import ProductListRowSerializer, ProductListSerializer
+from products.views import ProductViewSet
+
+
+class Command(BaseCommand):
+    help = 'Check ProductListRowSerializer against ProductListSerializer and compare their rows/s'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--products', type=int, default=5000,
+            help='Size of the temporary generated catalog (rolled back afterwards)'
+        )
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per serializer')
+
+    def handle(self, *args, **options):
+        with transaction.atomic(), override_settings(ALLOWED_HOSTS=['*']):
+            generate_products(options['products'], generate_categories(10, seed='serializers'), seed='serializers')
+            products = Product.objects.filter(slug__startswith='generated-product-serializers-')
+            # Cover image URLs (with characters that need quoting) and unknown styles
+            products.filter(pk__in=products.values_list('pk', flat=True)[::3]).update(
+                primary_image='products/kente wrap #1.jpg',
+                image_derivatives={'products/kente wrap #1.jpg': {'width': 800, 'height': 600, 'derivatives': [
+                    {'format': 'webp', 'width': 320, 'height': 240, 'name': 'derivatives/products/kente wrap #1-320w.webp', 'bytes': 1},
+                    {'format': 'jpeg', 'width': 320, 'height': 240, 'name': 'derivatives/products/kente wrap #1-320w.jpg', 'bytes': 1},
+                ]}},
+            )
+            products.filter(pk__in=products.values_list('pk', flat=True)[::7]).update(african_style='')
+            queryset = products.select_related('category').only(*ProductViewSet.list_fields).order_by('pk')
+            context = {'request': Request(APIRequestFactory().get('/api/products/'))}
+
+            def serialize_instances():
+                return ProductListSerializer(list(queryset.all()), many=True, context=context).data
+
+            def serialize_rows():
+                rows = list(queryset.values(*ProductViewSet.list_fields))
+                return ProductListRowSerializer(rows, many=True, context=context).data
+
+            expected = json.dumps(serialize_instances(), cls=JSONEncoder)
+            actual = json.dumps(serialize_rows(), cls=JSONEncoder)
+            if actual != expected:
+                raise CommandError('ProductListRowSerializer output differs from ProductListSerializer')
+            self.stdout.write(self.style.SUCCESS(f'Identical JSON for {options["products"]} products'))
+
+            results = {}
+            for name, serialize in [('ProductListSerializer', serialize_instances), ('ProductListRowSerializer', serialize_rows)]:
+                timings = []
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    serialize()
+                    timings.append(time.perf_counter() - start)
+                results[name] = options['products'] / min(timings)
+                self.stdout.write(f'{name:<26} {results[name]:>10.0f} rows/s (query + serialization)')
+            self.stdout.write(
+                f'Speedup: {results["ProductListRowSerializer"] / results["ProductListSerializer"]:.1f}x'
+            )
+            transaction.set_rollback(True)
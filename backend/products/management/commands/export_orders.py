@@ -0,0 +1,51 @@
+import datetime
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.catalog_io import FORMATS, RowWriter, guess_format
+from products.models import Order
+from products.order_export import FIELDS, JSON_FIELDS, export_rows, filter_orders
+
+
+class Command(BaseCommand):
+    help = 'Stream orders, one row per item with product and customer details, to a CSV or JSONL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Output file, or '-' for stdout")
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension (csv otherwise)')
+        parser.add_argument('--start', type=datetime.date.fromisoformat, help='First order date (YYYY-MM-DD)')
+        parser.add_argument('--end', type=datetime.date.fromisoformat, help='Last order date (YYYY-MM-DD)')
+        parser.add_argument('--status', help='Comma-separated order statuses')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        statuses = [status for status in (options['status'] or '').split(',') if status]
+        unknown = set(statuses) - set(dict(Order.STATUS_CHOICES))
+        if unknown:
+            raise CommandError(f'Unknown statuses: {", ".join(sorted(unknown))}')
+        orders = filter_orders(start=options['start'], end=options['end'], statuses=statuses)
+
+        path = options['path']
+        to_stdout = path == '-'
+        file = sys.stdout if to_stdout else open(path, 'w', newline='', encoding='utf-8')
+        # Progress goes to stderr when the data itself goes to stdout
+        log = self.stderr if to_stdout else self.stdout
+        writer = RowWriter(file, options['format'] or guess_format(path), FIELDS, JSON_FIELDS)
+        exported = 0
+        start = time.perf_counter()
+        try:
+            for row in export_rows(orders, options['chunk_size']):
+                writer.write(row)
+                exported += 1
+                if exported % 100000 == 0:
+                    log.write(f'{exported} rows exported ({exported / (time.perf_counter() - start):.0f} rows/s)')
+        finally:
+            if not to_stdout:
+                file.close()
+
+        elapsed = time.perf_counter() - start
+        log.write(self.style.SUCCESS(
+            f'Exported {exported} order items in {elapsed:.1f}s ({exported / max(elapsed, 1e-9):.0f} rows/s)'
+        ))
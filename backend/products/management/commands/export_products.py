@@ -0,0 +1,45 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.catalog_io import FORMATS, RowWriter, export_rows, guess_format
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Stream the product catalog to a CSV or JSONL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Output file, or '-' for stdout")
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension (csv otherwise)')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--active-only', action='store_true')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        queryset = Product.objects.all()
+        if options['active_only']:
+            queryset = queryset.filter(is_active=True)
+
+        to_stdout = path == '-'
+        file = sys.stdout if to_stdout else open(path, 'w', newline='', encoding='utf-8')
+        # Progress goes to stderr when the data itself goes to stdout
+        log = self.stderr if to_stdout else self.stdout
+        writer = RowWriter(file, options['format'] or guess_format(path))
+        exported = 0
+        start = time.perf_counter()
+        try:
+            for row in export_rows(queryset, options['chunk_size']):
+                writer.write(row)
+                exported += 1
+                if exported % 10000 == 0:
+                    log.write(f'{exported} products exported ({exported / (time.perf_counter() - start):.0f} rows/s)')
+        finally:
+            if not to_stdout:
+                file.close()
+
+        elapsed = time.perf_counter() - start
+        log.write(self.style.SUCCESS(
+            f'Exported {exported} products in {elapsed:.1f}s ({exported / max(elapsed, 1e-9):.0f} rows/s)'
+        ))
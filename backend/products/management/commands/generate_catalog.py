@@ -0,0 +1,59 @@
+import time
+from contextlib import contextmanager
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from products.cache import invalidate_catalog
+from products.datagen import END, generate_categories, generate_customers, generate_orders, generate_products
+from products.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Generate a large synthetic catalog, customers and order history for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=1000)
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--customers', type=int, default=10000)
+        parser.add_argument('--orders', type=int, default=1000000)
+        parser.add_argument(
+            '--seed', default='0',
+            help='The same seed and volumes always produce the same data; slugs and usernames include it'
+        )
+        parser.add_argument(
+            '--end', type=date.fromisoformat, default=END,
+            help=f'Day the generated year of history ends (default {END}, so runs are reproducible)'
+        )
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per INSERT')
+
+    def handle(self, *args, **options):
+        seed, batch_size = options['seed'], options['batch_size']
+        if Category.objects.filter(slug__startswith=f'generated-category-{seed}-').exists():
+            raise CommandError(f'Data for seed {seed!r} already exists; pick another --seed')
+
+        with self.step('categories', options['categories']), transaction.atomic():
+            categories = generate_categories(options['categories'], seed=seed, end=options['end'])
+
+        if categories:
+            with self.step('products', options['products']), transaction.atomic():
+                generate_products(options['products'], categories, seed=seed, batch_size=batch_size, end=options['end'])
+
+        with self.step('customers', options['customers']), transaction.atomic():
+            customer_ids = generate_customers(options['customers'], seed=seed, batch_size=batch_size, end=options['end'])
+
+        with self.step('orders', options['orders']), transaction.atomic():
+            generate_orders(
+                options['orders'], customer_ids, seed=seed, batch_size=batch_size, end=options['end'],
+                progress=lambda done: done % 100000 or self.stdout.write(f'  {done} orders...'),
+            )
+
+        invalidate_catalog()
+
+    @contextmanager
+    def step(self, name, count):
+        start = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'{count:>9} {name:<10} {elapsed:>8.1f}s ({count / max(elapsed, 1e-9):.0f} rows/s)')
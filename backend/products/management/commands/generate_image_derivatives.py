@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.images import needs_derivatives, process_instance
+from products.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = 'Generate missing WebP/JPEG image derivatives for existing products and categories'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Regenerate every derivative, e.g. after changing IMAGE_DERIVATIVE_WIDTHS'
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        for model in (Category, Product):
+            processed = 0
+            fields = ['pk', 'image_derivatives', 'image' if model is Category else 'primary_image']
+            if model is Product:
+                fields.append('image_gallery')
+            for instance in model.objects.only(*fields).iterator(chunk_size=500):
+                if not options['force'] and not needs_derivatives(instance):
+                    continue
+                process_instance(model, instance.pk, force=options['force'])
+                processed += 1
+            self.stdout.write(f'{str(model._meta.verbose_name_plural).capitalize()}: {processed} processed')
+        self.stdout.write(f'Done in {time.perf_counter() - start:.1f}s')
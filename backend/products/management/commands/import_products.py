@@ -0,0 +1,113 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from products.cache import invalidate_catalog
+from products.catalog_io import (
+    FIELDS, FORMATS, chunked, guess_format, provided_fields, read_rows, row_slug, row_to_product,
+)
+from products.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = 'Stream products from a CSV or JSONL file into the catalog, upserting on slug'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for stdin")
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension (csv otherwise)')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument(
+            '--create-categories', action='store_true',
+            help='Create categories for unknown category slugs instead of skipping those rows'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or guess_format(path)
+        # One lookup map for the whole import
+        category_ids = dict(Category.objects.values_list('slug', 'pk'))
+
+        file = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        imported = 0
+        self.skipped = 0
+        touched_categories = set()
+        start = time.perf_counter()
+        try:
+            for chunk in chunked(read_rows(file, format, on_error=self.skip), options['chunk_size']):
+                if options['create_categories']:
+                    self.create_missing_categories(chunk, category_ids)
+
+                # Slug -> (pk, category id) of the products this chunk updates
+                existing = {
+                    slug: (pk, category_id) for slug, pk, category_id in Product.objects.filter(
+                        slug__in={row_slug(row) for _, row in chunk}
+                    ).values_list('slug', 'pk', 'category_id')
+                }
+                products = {}
+                for line_number, row in chunk:
+                    try:
+                        product = row_to_product(row, category_ids, existing)
+                    except (ValueError, TypeError) as error:
+                        self.skip(line_number, error)
+                        continue
+                    # The last row wins when a chunk repeats a slug
+                    products[product.slug] = (product, provided_fields(row))
+
+                imported += self.upsert(products.values(), existing)
+                touched_categories.update(product.category_id for product, _ in products.values())
+                touched_categories.update(existing[slug][1] for slug in products.keys() & existing.keys())
+                elapsed = time.perf_counter() - start
+                self.stdout.write(f'{imported} products imported ({imported / elapsed:.0f} rows/s)')
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        finally:
+            if file is not sys.stdin:
+                file.close()
+
+        # Bulk upserts bypass model signals, so refresh caches and validators here
+        Category.objects.filter(pk__in=touched_categories).update(updated_at=timezone.now())
+        invalidate_catalog()
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} products in {elapsed:.1f}s ({imported / max(elapsed, 1e-9):.0f} rows/s), '
+            f'skipped {self.skipped}'
+        ))
+
+    def create_missing_categories(self, chunk, category_ids):
+        missing = {row.get('category') for _, row in chunk} - category_ids.keys() - {None, ''}
+        if missing:
+            Category.objects.bulk_create(
+                [Category(name=slug.replace('-', ' ').title(), slug=slug) for slug in missing],
+                ignore_conflicts=True,
+            )
+            category_ids.update(Category.objects.filter(slug__in=missing).values_list('slug', 'pk'))
+
+    def skip(self, line_number, error):
+        self.stderr.write(f'Line {line_number}: skipped ({error})')
+        self.skipped += 1
+
+    def upsert(self, products, existing):
+        """Insert new slugs and update existing ones with one statement per set of columns"""
+        # Only overwrite the columns each row provides: rows missing a key
+        # must not reset it to the model default
+        groups = {}
+        for product, provided in products:
+            if product.slug in existing:
+                # Updates may leave out NOT NULL columns. The upsert's INSERT
+                # still needs values for them, which the conflict then discards.
+                if product.category_id is None:
+                    product.category_id = existing[product.slug][1]
+                if product.price is None:
+                    product.price = 0
+            groups.setdefault(provided, []).append(product)
+        with transaction.atomic():
+            for provided, group in groups.items():
+                update_fields = [field for field in FIELDS if field in provided and field != 'slug'] + ['updated_at']
+                Product.objects.bulk_create(
+                    group, update_conflicts=True, unique_fields=['slug'], update_fields=update_fields,
+                )
+        return sum(len(group) for group in groups.values())
@@ -0,0 +1,66 @@
+import logging
+import multiprocessing
+import os
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from products.jobs import TASKS, Worker
+
+
+logger = logging.getLogger('products.jobs')
+
+
+def run_worker_process(poll_interval, burst):
+    Worker(poll_interval, burst).run()
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (image derivatives, cache warming, order notifications)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='Worker processes, each running one job at a time')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when no job is available')
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Tasks: {", ".join(sorted(TASKS))}')
+        if options['processes'] == 1:
+            run_worker_process(options['poll_interval'], options['burst'])
+            return
+
+        # Forked children must not share the parent's database connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = {}
+        stopping = False
+
+        def start(index):
+            process = context.Process(target=run_worker_process, args=(options['poll_interval'], options['burst']))
+            process.start()
+            processes[index] = process
+
+        def stop(signum, frame):
+            nonlocal stopping
+            stopping = True
+            # Workers finish their current job, then exit
+            for process in processes.values():
+                if process.is_alive():
+                    os.kill(process.pid, signal.SIGTERM)
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        for index in range(options['processes']):
+            start(index)
+
+        while any(process.is_alive() for process in processes.values()) or not (stopping or options['burst']):
+            for index, process in list(processes.items()):
+                if process.is_alive() or stopping or options['burst']:
+                    continue
+                logger.warning('Worker process %s exited with code %s, restarting', process.pid, process.exitcode)
+                start(index)
+            time.sleep(1)
+        for process in processes.values():
+            process.join()
@@ -0,0 +1,250 @@
+"""Prometheus-style metrics shared between gunicorn worker processes.
+
+Each process keeps its counters and histograms in memory and a background
+thread writes them to ``METRICS_DIR/<pid>.json`` about once a second. The
+metrics endpoint adds up the files of every worker, so a scrape sees the
+whole server no matter which worker answers it. Files of exited workers
+are kept so their counts are not lost; clear ``METRICS_DIR`` when the
+server is (re)started.
+
+Everything is a no-op unless ``METRICS_ENABLED`` is set.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import Http404, HttpResponse
+
+
+# Latency buckets in seconds, and query count buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class FileStore:
+    """This process's metric values, mirrored to a file per process id."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+        self.pid = None
+        self.dirty = False
+
+    def directory(self):
+        return settings.METRICS_DIR
+
+    def update(self, key, update):
+        with self.lock:
+            if self.pid != os.getpid():
+                # First write in this process, or in a worker forked from a
+                # process that already had values: start from zero
+                self.pid = os.getpid()
+                self.values = {}
+                threading.Thread(target=self.flush_periodically, daemon=True).start()
+                atexit.register(self.flush)
+            self.values[key] = update(self.values.get(key))
+            self.dirty = True
+
+    def flush_periodically(self):
+        while True:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            if not self.dirty or self.pid != os.getpid():
+                return
+            snapshot = [[list(key), value] for key, value in self.values.items()]
+            self.dirty = False
+        os.makedirs(self.directory(), exist_ok=True)
+        path = os.path.join(self.directory(), f'{self.pid}.json')
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(snapshot, file)
+        # Readers never see a half-written file
+        os.replace(temporary, path)
+
+    def collect(self):
+        """Values of every process, summed per key."""
+        self.flush()
+        totals = {}
+        try:
+            names = os.listdir(self.directory())
+        except FileNotFoundError:
+            return totals
+        for name in names:
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory(), name)) as file:
+                    snapshot = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for key, value in snapshot:
+                key = tuple(key[:2]) + (tuple(map(tuple, key[2])),)
+                totals[key] = add(totals.get(key), value)
+        return totals
+
+
+def add(total, value):
+    if total is None:
+        return value
+    if isinstance(value, list):
+        return [add(a, b) for a, b in zip(total, value)]
+    return total + value
+
+
+store = FileStore()
+registry = []
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.append(self)
+
+    def key(self, labels):
+        return (self.type, self.name, tuple((name, str(labels[name])) for name in self.labelnames))
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if settings.METRICS_ENABLED:
+            store.update(self.key(labels), lambda value: (value or 0) + amount)
+
+    def expose(self, values):
+        return [f'{self.name}{format_labels(labels)} {value}' for labels, value in values]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, amount, **labels):
+        if not settings.METRICS_ENABLED:
+            return
+
+        def update(value):
+            # Per-bucket counts (made cumulative on exposition), then sum and count
+            value = value or [0] * (len(self.buckets) + 3)
+            for index, bound in enumerate(self.buckets):
+                if amount <= bound:
+                    value[index] += 1
+                    break
+            else:
+                value[len(self.buckets)] += 1
+            value[-2] += amount
+            value[-1] += 1
+            return value
+
+        store.update(self.key(labels), update)
+
+    def expose(self, values):
+        lines = []
+        for labels, value in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), value):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{format_labels(labels + (("le", str(bound)),))} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(labels)} {value[-2]}')
+            lines.append(f'{self.name}_count{format_labels(labels)} {value[-1]}')
+        return lines
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def generate_latest():
+    """All metrics in the Prometheus text exposition format."""
+    values = defaultdict(list)
+    for (type, name, labels), value in sorted(store.collect().items()):
+        values[name].append((labels, value))
+    lines = []
+    for metric in registry:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        lines.extend(metric.expose(values[metric.name]))
+    return '\n'.join(lines) + '\n'
+
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency per view action.', ['view', 'method'],
+)
+REQUEST_QUERIES = Histogram(
+    'http_request_queries', 'Database queries per request.', ['view'], buckets=QUERY_BUCKETS,
+)
+REQUESTS = Counter('http_requests_total', 'Requests by view action and status.', ['view', 'method', 'status'])
+REQUEST_ERRORS = Counter('http_request_errors_total', 'Responses with a 4xx or 5xx status.', ['view', 'status'])
+ORDERS_CREATED = Counter('orders_created_total', 'Orders created through the API.')
+CATALOG_CACHE = Counter('catalog_cache_requests_total', 'Catalog cache lookups by result.', ['endpoint', 'result'])
+JOBS = Counter('jobs_total', 'Background job runs by task and result.', ['task', 'result'])
+
+
+def get_view_label(request):
+    """``ViewSet.action`` for DRF viewsets, the URL name otherwise."""
+    match = request.resolver_match
+    if match is None:
+        return 'unmatched'
+    cls = getattr(match.func, 'cls', None)
+    actions = getattr(match.func, 'actions', None)
+    if cls is not None and actions:
+        return f'{cls.__name__}.{actions.get(request.method.lower(), request.method.lower())}'
+    return match.view_name or 'unnamed'
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(None)
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        with connections['default'].execute_wrapper(count_query):
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        view = get_view_label(request)
+        REQUEST_LATENCY.observe(duration, view=view, method=request.method)
+        REQUEST_QUERIES.observe(len(queries), view=view)
+        REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        if response.status_code >= 400:
+            REQUEST_ERRORS.inc(view=view, status=response.status_code)
+        return response
+
+
+def metrics_view(request):
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    return HttpResponse(generate_latest(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from products.search import install_search_index, uninstall_search_index
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_product_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchIndex',
+            fields=[
+                ('product', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='products.product')),
+                ('query', models.TextField(db_column='products_product_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'products_product_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:37
+
+from django.db import migrations, models
+
+from products.search import install_search_index
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_category_updated_at'),
+    ]
+
+    operations = [
+        # Runs last when unapplying, after RemoveField has rebuilt the table
+        migrations.RunPython(migrations.RunPython.noop, install_search_index),
+        migrations.AddField(
+            model_name='category',
+            name='image_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='image_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        # SQLite adds the column by rebuilding products_product, which drops
+        # the full-text search triggers
+        migrations.RunPython(install_search_index, migrations.RunPython.noop),
+    ]
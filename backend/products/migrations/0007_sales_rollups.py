@@ -0,0 +1,80 @@
+# Generated by Django 4.2.30 on 2026-10-17 17:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyOrderTotals',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('shipping_country', models.CharField(max_length=100)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('in_progress', 'In Progress'), ('ready', 'Ready for Pickup/Delivery'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('orders', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily order totals',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('african_style', models.CharField(blank=True, choices=[('dashiki', 'Dashiki Style'), ('kaftan', 'Kaftan Style'), ('agbada', 'Agbada Style'), ('boubou', 'Boubou Style'), ('kente', 'Kente Inspired'), ('ankara', 'Ankara Pattern'), ('mudcloth', 'Mudcloth Design'), ('traditional', 'Traditional African'), ('modern_african', 'Modern African Fusion'), ('crochet_traditional', 'Traditional Crochet'), ('crochet_modern', 'Modern Crochet')], max_length=20)),
+                ('size', models.CharField(blank=True, max_length=10)),
+                ('color', models.CharField(blank=True, max_length=50)),
+                ('shipping_country', models.CharField(max_length=100)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('in_progress', 'In Progress'), ('ready', 'Ready for Pickup/Delivery'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('items', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily product sales',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at'], name='order_created_at_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailyproductsales',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.category'),
+        ),
+        migrations.AddField(
+            model_name='dailyproductsales',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyordertotals',
+            constraint=models.UniqueConstraint(fields=('date', 'shipping_country', 'status'), name='daily_order_totals_key'),
+        ),
+        migrations.CreateModel(
+            name='SalesDashboard',
+            fields=[
+            ],
+            options={
+                'verbose_name_plural': 'Sales dashboard',
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('products.dailyordertotals',),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyproductsales',
+            constraint=models.UniqueConstraint(fields=('date', 'product', 'size', 'color', 'shipping_country', 'status'), name='daily_product_sales_key'),
+        ),
+    ]
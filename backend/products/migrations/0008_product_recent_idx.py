@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-created_at'], name='product_recent_idx'),
+        ),
+    ]
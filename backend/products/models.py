@@ -1,15 +1,49 @@
-from django.db import models
+from datetime import timedelta
+
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum, Window
+from django.db.models.functions import RowNumber
+from django.dispatch import Signal
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.utils.text import slugify
 
+from .cache import invalidate_catalog
+from .order_numbers import generate_order_number
+
+
+# Sent inside Order.change_status's transaction with the ``order`` and its
+# ``old_status``; keeps the sales rollups in step (see products.signals)
+order_status_changed = Signal()
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_id):
+        super().__init__(f"Not enough stock for product {product_id}")
+        self.product_id = product_id
+
+
+class CategoryQuerySet(models.QuerySet):
+    def with_products_count(self):
+        """Annotate each category with the number of its active products."""
+        return self.annotate(
+            active_products_count=Count('products', filter=Q(products__is_active=True))
+        )
+
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True)
     description = models.TextField(blank=True)
     image = models.ImageField(upload_to="categories/", blank=True, null=True)
+    # Resized WebP/JPEG versions of the image, see products.images
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Also touched when one of its products changes, see products.signals
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = CategoryQuerySet.as_manager()
 
     class Meta:
         verbose_name_plural = "Categories"
@@ -23,6 +57,65 @@ class Category(models.Model):
         super().save(*args, **kwargs)
 
 
+class ProductQuerySet(models.QuerySet):
+    def top_per_category(self, limit):
+        """Keep only the first ``limit`` products of each category.
+
+        Rows are ranked with the queryset's own ordering (plus ``id`` as a
+        tiebreaker) so the whole result comes back in a single query. Backends
+        without window functions (SQLite < 3.25) fall back to a correlated
+        ``LIMIT`` subquery.
+        """
+        ordering = [*(self.query.order_by or self.model._meta.ordering), '-id']
+        if connection.features.supports_over_clause:
+            return self.annotate(
+                category_rank=Window(
+                    expression=RowNumber(),
+                    partition_by=F('category_id'),
+                    order_by=ordering,
+                )
+            ).filter(category_rank__lte=limit)
+        top_ids = (
+            self.filter(category_id=OuterRef('category_id'))
+            .order_by(*ordering)
+            .values('pk')[:limit]
+        )
+        return self.filter(pk__in=Subquery(top_ids))
+
+    def reserve_stock(self, quantities):
+        """Take ``{product_id: quantity}`` out of stock, all or nothing.
+
+        Each product is decremented with a conditional UPDATE that only
+        succeeds while enough stock remains, so concurrent checkouts never
+        oversell and only lock the rows they buy. Products are updated in id
+        order to avoid deadlocks. Made-to-order products are skipped.
+        Raises InsufficientStock, rolling back every decrement. The cached
+        catalog is invalidated once the decrements commit.
+        """
+        with transaction.atomic():
+            touched = 0
+            for product_id, quantity in sorted(quantities.items()):
+                updated = self.filter(
+                    pk=product_id, stock_quantity__gte=quantity, is_custom_order=False
+                ).update(stock_quantity=F('stock_quantity') - quantity, updated_at=timezone.now())
+                if not updated and not self.filter(pk=product_id, is_custom_order=True).exists():
+                    raise InsufficientStock(product_id)
+                touched += updated
+            if touched:
+                transaction.on_commit(invalidate_catalog)
+
+    def release_stock(self, quantities):
+        """Put ``{product_id: quantity}`` back in stock (made-to-order products excepted)."""
+        with transaction.atomic():
+            touched = 0
+            for product_id, quantity in sorted(quantities.items()):
+                touched += self.filter(pk=product_id, is_custom_order=False).update(
+                    stock_quantity=F('stock_quantity') + quantity, updated_at=timezone.now()
+                )
+            if touched:
+                transaction.on_commit(invalidate_catalog)
+
+
 class Product(models.Model):
     AFRICAN_STYLES = [
         ('dashiki', 'Dashiki Style'),
@@ -64,6 +157,8 @@ class Product(models.Model):
     # Images
     primary_image = models.ImageField(upload_to="products/", blank=True, null=True)
     image_gallery = models.JSONField(default=list, help_text="Additional product images")
+    # Resized WebP/JPEG versions of the primary and gallery images, see products.images
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     
     # Inventory and status
     stock_quantity = models.PositiveIntegerField(default=0)
@@ -80,8 +175,41 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        # Partial indexes over active products, one per ProductViewSet filter path.
+        # Backends without partial index support skip them.
+        indexes = [
+            models.Index(
+                fields=['-created_at'], condition=Q(is_active=True),
+                name='product_active_recent_idx',
+            ),
+            models.Index(
+                fields=['category', '-created_at'], condition=Q(is_active=True),
+                name='product_active_category_idx',
+            ),
+            models.Index(
+                fields=['african_style', '-created_at'], condition=Q(is_active=True),
+                name='product_active_style_idx',
+            ),
+            models.Index(
+                fields=['price'], condition=Q(is_active=True),
+                name='product_active_price_idx',
+            ),
+            models.Index(
+                fields=['-created_at'], condition=Q(is_active=True, is_featured=True),
+                name='product_featured_idx',
+            ),
+            models.Index(
+                fields=['-created_at'],
+                condition=Q(is_active=True) & (Q(stock_quantity__gt=0) | Q(is_custom_order=True)),
+                name='product_available_idx',
+            ),
+            # Every product, newest first, for the admin change list
+            models.Index(fields=['-created_at'], name='product_recent_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -96,6 +224,24 @@ class Product(models.Model):
         return self.stock_quantity > 0 or self.is_custom_order
 
 
+class ProductSearchIndex(models.Model):
+    """Read-only view of the SQLite FTS5 table kept by products.search.
+
+    ``query`` maps to the table's hidden column of the same name, where
+    ``=`` runs a full-text MATCH; ``rank`` is the configured bm25() score.
+    """
+    product = models.OneToOneField(
+        Product, on_delete=models.DO_NOTHING, primary_key=True,
+        db_column='rowid', related_name='search_index',
+    )
+    query = models.TextField(db_column='products_product_fts')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'products_product_fts'
+
+
 class Customer(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     phone = models.CharField(max_length=20, blank=True)
@@ -148,15 +294,60 @@ class Order(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Date ranges for the sales rollups and their backfill
+            models.Index(fields=['created_at'], name='order_created_at_idx'),
+        ]
 
     def __str__(self):
         return f"Order {self.order_number} - {self.customer}"
 
+    def get_stock_quantities(self):
+        """``{product_id: quantity}`` over this order's stocked (not made-to-order) items"""
+        return dict(
+            self.items.filter(product__is_custom_order=False).values_list('product').annotate(quantity=Sum('quantity')).order_by()
+        )
+
+    def change_status(self, new_status):
+        """Set the status, releasing stock on cancellation and reserving it again on reopening.
+
+        The status change is claimed with a conditional UPDATE, so concurrent
+        requests cannot release (or reserve) the same order's stock twice.
+        May raise InsufficientStock when reopening a cancelled order. Sends
+        order_status_changed when the status actually changes.
+        """
+        cancelling = new_status == 'cancelled'
+        with transaction.atomic():
+            old_status = Order.objects.select_for_update().filter(pk=self.pk).values_list('status', flat=True).get()
+            orders = Order.objects.filter(pk=self.pk)
+            if cancelling:
+                orders = orders.exclude(status='cancelled')
+            else:
+                orders = orders.filter(status='cancelled')
+            claimed = orders.update(status=new_status, updated_at=timezone.now())
+            if claimed:
+                if cancelling:
+                    Product.objects.release_stock(self.get_stock_quantities())
+                else:
+                    Product.objects.reserve_stock(self.get_stock_quantities())
+            else:
+                Order.objects.filter(pk=self.pk).update(status=new_status, updated_at=timezone.now())
+            self.refresh_from_db(fields=['status', 'updated_at'])
+            if old_status != new_status:
+                order_status_changed.send(sender=Order, order=self, old_status=old_status)
+
     def save(self, *args, **kwargs):
-        if not self.order_number:
-            import uuid
-            self.order_number = f"FC{uuid.uuid4().hex[:8].upper()}"
-        super().save(*args, **kwargs)
+        if self.order_number:
+            return super().save(*args, **kwargs)
+        for attempt in range(3):
+            self.order_number = generate_order_number()
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                # Retry only when another writer took this order number
+                if attempt == 2 or not Order.objects.filter(order_number=self.order_number).exists():
+                    raise
 
 
 class OrderItem(models.Model):
@@ -180,3 +371,162 @@ class OrderItem(models.Model):
     def save(self, *args, **kwargs):
         self.total_price = self.unit_price * self.quantity
         super().save(*args, **kwargs)
+
+
+class DailyProductSales(models.Model):
+    """Order item totals per day, product, size, colour, shipping country and order status.
+
+    Category and style are copied from the product when the sale is first
+    recorded. Maintained by products.analytics.
+    """
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')
+    african_style = models.CharField(max_length=20, choices=Product.AFRICAN_STYLES, blank=True)
+    size = models.CharField(max_length=10, blank=True)
+    color = models.CharField(max_length=50, blank=True)
+    shipping_country = models.CharField(max_length=100)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # Order items summed into this row
+    items = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Daily product sales"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'product', 'size', 'color', 'shipping_country', 'status'],
+                name='daily_product_sales_key',
+            ),
+        ]
+
+
+class DailyOrderTotals(models.Model):
+    """Order counts and totals per day, shipping country and status; maintained by products.analytics"""
+    date = models.DateField()
+    shipping_country = models.CharField(max_length=100)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    orders = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = "Daily order totals"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'shipping_country', 'status'], name='daily_order_totals_key'),
+        ]
+
+
+class SalesDashboard(DailyOrderTotals):
+    """Admin entry for the sales dashboard, see SalesDashboardAdmin"""
+    class Meta:
+        proxy = True
+        verbose_name_plural = "Sales dashboard"
+
+
+class JobQuerySet(models.QuerySet):
+    def available(self):
+        """Queued jobs that are due, and running jobs whose lock expired (their worker stopped renewing it)."""
+        now = timezone.now()
+        return self.filter(
+            Q(status='queued', run_at__lte=now) | Q(status='running', locked_until__lt=now)
+        )
+
+    def claim(self, worker, timeout, pk=None):
+        """Lock the next available job for ``worker`` and return it, or None.
+
+        PostgreSQL (and other backends with SKIP LOCKED) lock the row with
+        ``SELECT ... FOR UPDATE SKIP LOCKED``, so concurrent workers never
+        wait on each other. SQLite has no row locks: there a job is claimed
+        with a conditional UPDATE that only matches while the job is still
+        available with the attempt count that was read, so two workers can
+        race for a job but only one wins it.
+        """
+        locked_until = timezone.now() + timedelta(seconds=timeout)
+        jobs = self.available().order_by('run_at', 'pk')
+        if pk is not None:
+            jobs = jobs.filter(pk=pk)
+
+        if connection.features.has_select_for_update_skip_locked:
+            with transaction.atomic():
+                job = jobs.select_for_update(skip_locked=True).first()
+                if job is None:
+                    return None
+                job.status = 'running'
+                job.attempts += 1
+                job.locked_by = worker
+                job.locked_until = locked_until
+                job.save(update_fields=['status', 'attempts', 'locked_by', 'locked_until', 'updated_at'])
+                return job
+
+        for candidate_pk, attempts in jobs.values_list('pk', 'attempts')[:10]:
+            claimed = self.available().filter(pk=candidate_pk, attempts=attempts).update(
+                status='running',
+                attempts=attempts + 1,
+                locked_by=worker,
+                locked_until=locked_until,
+                updated_at=timezone.now(),
+            )
+            if claimed:
+                return self.get(pk=candidate_pk)
+        return None
+
+
+class Job(models.Model):
+    """A task queued for the run_worker command, see products.jobs"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    task = models.CharField(max_length=200)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    # Earliest time the job may run; pushed back between retries
+    run_at = models.DateTimeField(default=timezone.now)
+    # Worker holding a running job, and when other workers may take it over
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    objects = JobQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
+
+    def renew(self, worker, timeout):
+        """Extend the lock of a running job by ``timeout`` seconds; False if another worker took it over."""
+        return bool(
+            Job.objects.filter(pk=self.pk, status='running', locked_by=worker, attempts=self.attempts).update(
+                locked_until=timezone.now() + timedelta(seconds=timeout), updated_at=timezone.now(),
+            )
+        )
+
+    def finish(self, worker, status, error='', retry_at=None):
+        """Record the outcome of a claimed job; False if another worker took it over meanwhile."""
+        fields = {
+            'status': status,
+            'last_error': error,
+            'locked_by': '',
+            'locked_until': None,
+            'updated_at': timezone.now(),
+            'finished_at': None if status == 'queued' else timezone.now(),
+        }
+        if retry_at is not None:
+            fields['run_at'] = retry_at
+        return bool(
+            Job.objects.filter(pk=self.pk, status='running', locked_by=worker, attempts=self.attempts).update(**fields)
+        )
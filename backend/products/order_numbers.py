@@ -0,0 +1,51 @@
+"""Time-ordered order numbers.
+
+An order number is ``FC`` followed by a 48-bit millisecond timestamp and
+40 random bits, both in Crockford base32 (20 characters in all). New
+numbers sort after older ones, so inserts land at the right edge of the
+unique index instead of at random pages. Within a process, numbers
+generated in the same millisecond increment the random part, so they stay
+strictly increasing. Between processes, 40 random bits per millisecond
+make collisions practically impossible, and ``Order.save`` retries if one
+ever happens.
+"""
+import secrets
+import threading
+import time
+
+
+PREFIX = 'FC'
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+RANDOM_BITS = 40
+
+_lock = threading.Lock()
+_last_timestamp = 0
+_last_random = 0
+
+
+def encode(value, length):
+    chars = []
+    for _ in range(length):
+        value, remainder = divmod(value, 32)
+        chars.append(ALPHABET[remainder])
+    return ''.join(reversed(chars))
+
+
+def generate_order_number():
+    global _last_timestamp, _last_random
+    with _lock:
+        timestamp = time.time_ns() // 1_000_000
+        if timestamp <= _last_timestamp:
+            timestamp, random_part = _last_timestamp, _last_random + 1
+            if random_part >= 1 << RANDOM_BITS:
+                timestamp, random_part = timestamp + 1, 0
+        else:
+            # Leave headroom for increments within the same millisecond
+            random_part = secrets.randbits(RANDOM_BITS - 1)
+        _last_timestamp, _last_random = timestamp, random_part
+    return format_order_number(timestamp, random_part)
+
+
+def format_order_number(timestamp, random_part):
+    """The order number for a millisecond timestamp and RANDOM_BITS random bits"""
+    return PREFIX + encode(timestamp, 10) + encode(random_part, 8)
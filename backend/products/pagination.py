@@ -0,0 +1,179 @@
+import base64
+import json
+from functools import partial
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework import filters
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KnownCountPaginator(Paginator):
+    """Paginator that uses a row count the caller already has instead of running COUNT(*)"""
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if count is not None:
+            self.count = count
+
+
+class ConditionalPagination(PageNumberPagination):
+    """Page-number pagination reusing the row count that ``conditional_get`` computed for the ETag"""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        count = getattr(view, 'conditional_count', None)
+        if count is not None:
+            self.django_paginator_class = partial(KnownCountPaginator, count=count)
+        return super().paginate_queryset(queryset, request, view)
+
+
+class ProductPagination(ConditionalPagination):
+    """Page-number pagination, with an opt-in keyset (cursor) mode.
+
+    Clients start cursor mode with ``?pagination=cursor`` and follow the
+    ``next``/``previous`` links, which carry a ``cursor`` parameter. Pages
+    are selected with a ``WHERE (ordering..., id) > (last row)`` condition
+    instead of ``OFFSET``, and no ``COUNT(*)`` is run, so deep pages cost
+    the same as the first one. The ordering still comes from ``?ordering=``
+    with ``id`` appended as a tiebreaker.
+    """
+    mode_query_param = 'pagination'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def uses_cursor(self, request):
+        return (
+            self.cursor_query_param in request.query_params
+            or request.query_params.get(self.mode_query_param) == 'cursor'
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.uses_cursor(request)
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_keyset_ordering(request, queryset, view)
+        position, reverse = self.decode_cursor(request, queryset.model)
+
+        ordering = [(field, descending != reverse) for field, descending in self.ordering]
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(ordering, position))
+        queryset = queryset.order_by(*[f'-{field}' if descending else field for field, descending in ordering])
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page_rows = rows
+        if not rows:
+            # Links are built from the first and last rows on the page
+            self.has_next = self.has_previous = False
+        return rows
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_cursor_link(self.page_rows[-1], reverse=False) if self.has_next else None,
+            'previous': self.get_cursor_link(self.page_rows[0], reverse=True) if self.has_previous else None,
+            'results': data,
+        })
+
+    def get_keyset_ordering(self, request, queryset, view):
+        """The OrderingFilter ordering as (field, descending) pairs, ending with id"""
+        ordering = []
+        for backend in getattr(view, 'filter_backends', []):
+            if issubclass(backend, filters.OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, view) or []
+                break
+        pairs = [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+        pairs = [(field, descending) for field, descending in pairs if field not in ('id', 'pk')]
+        pairs.append(('id', pairs[-1][1] if pairs else False))
+        return pairs
+
+    def get_keyset_filter(self, ordering, position):
+        """Rows strictly after ``position`` in ``ordering``, as a row-value comparison"""
+        condition = Q()
+        for index, (field, descending) in enumerate(ordering):
+            equal = {prior_field: position[prior_index] for prior_index, (prior_field, _) in enumerate(ordering[:index])}
+            lookup = 'lt' if descending else 'gt'
+            condition |= Q(**equal, **{f'{field}__{lookup}': position[index]})
+        return condition
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            position, reverse = cursor['p'], bool(cursor['r'])
+            fields = [field for field, _ in self.ordering]
+            if not isinstance(position, list) or cursor['f'] != fields or len(position) != len(fields):
+                raise ValueError
+            # Validate values against the model fields so bad cursors are a 404, not a 500
+            for field, value in zip(fields, position):
+                model._meta.get_field(field).to_python(value)
+        except (TypeError, ValueError, KeyError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, row, reverse):
+        fields = [field for field, _ in self.ordering]
+        position = []
+        for field in fields:
+            # Rows are model instances or .values() dicts
+            value = row[field] if isinstance(row, dict) else getattr(row, field)
+            position.append(value.isoformat() if hasattr(value, 'isoformat') else str(value))
+        cursor = json.dumps({'f': fields, 'p': position, 'r': reverse}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+    def get_cursor_link(self, row, reverse):
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.mode_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(row, reverse))
+
+
+def estimate_count(queryset):
+    """The PostgreSQL planner's row estimate for ``queryset``"""
+    connection = connections[queryset.db]
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Admin change list paginator that never runs a full ``COUNT(*)`` on PostgreSQL.
+
+    Results are counted exactly up to ``exact_count_limit`` rows, by a
+    count that stops there. Past it, the planner's row estimate is used
+    instead, so the number of pages is approximate. Other databases have no
+    cheap estimate and count exactly.
+    """
+    exact_count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet) or connections[queryset.db].vendor != 'postgresql':
+            return super().count
+        queryset = queryset.order_by()
+        count = queryset[:self.exact_count_limit + 1].count()
+        if count <= self.exact_count_limit:
+            return count
+        return max(estimate_count(queryset), count)
@@ -17,3 +17,18 @@ class IsAdminOrReadOnly(BasePermission):
         if not api_key:
             return False
         return request.headers.get("X-API-KEY") == api_key
+
+
+class IsAdminOrAPIKey(BasePermission):
+    """Staff users, or any request with the ADMIN_API_KEY in the X-API-KEY header.
+
+    For admin-only data such as analytics, where reads must be protected too.
+    """
+
+    def has_permission(self, request, view):
+        if request.user and request.user.is_staff:
+            return True
+        api_key = os.getenv("ADMIN_API_KEY")
+        if not api_key:
+            return False
+        return request.headers.get("X-API-KEY") == api_key
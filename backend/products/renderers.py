@@ -0,0 +1,72 @@
+"""JSON renderer and parser backed by orjson, when it is installed.
+
+``FastJSONRenderer`` produces the same bytes as DRF's ``JSONRenderer``:
+compact separators, UTF-8 output with U+2028/U+2029 escaped, and
+Decimal, datetime, date, time, lazy strings and other non-JSON types
+converted by DRF's own ``JSONEncoder.default``. Datetimes are passed to
+that encoder rather than orjson's, so ``Z`` suffixes and microseconds
+are unchanged. The exceptions are floats below 1e-4 or from 1e16 upwards
+(e.g. ``1e16`` instead of ``1e+16``, the same number) and NaN/Infinity,
+which become ``null`` instead of an error. Anything orjson cannot encode,
+and indented or ASCII-only output, goes through the stdlib renderer.
+
+``FastJSONParser`` parses with orjson and falls back to the stdlib parser
+on any error, so invalid bodies get the usual ``ParseError`` message, and
+for bodies with integers that may not fit in 64 bits.
+"""
+import io
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# orjson reads integers beyond 64 bits as floats, so bodies with a run of 19
+# digits go to the stdlib parser. Mapping every digit to 9 and searching for
+# nineteen 9s is much faster than a regular expression.
+ALL_NINES = bytes.maketrans(b'012345678', b'999999999')
+LONG_NUMBER = b'9' * 19
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or orjson is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS,
+            )
+        except orjson.JSONEncodeError:
+            # Non-string keys, integers over 64 bits, unknown types: let the
+            # stdlib encoder produce its usual output or error
+            return super().render(data, accepted_media_type, renderer_context)
+        # Like JSONRenderer, escape the separators JavaScript treats as newlines
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class FastJSONParser(JSONParser):
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        if LONG_NUMBER in body.translate(ALL_NINES):
+            return super().parse(io.BytesIO(body), media_type, parser_context)
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            if encoding.lower().replace('-', '') == 'utf8':
+                return orjson.loads(body)
+            return orjson.loads(body.decode(encoding))
+        except (orjson.JSONDecodeError, UnicodeDecodeError, LookupError):
+            # Reparse with the stdlib for its ParseError message
+            return super().parse(io.BytesIO(body), media_type, parser_context)
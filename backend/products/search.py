@@ -0,0 +1,188 @@
+"""Full-text product search.
+
+PostgreSQL keeps a weighted ``tsvector`` column on ``products_product``
+(with a GIN index) and SQLite keeps an FTS5 external-content table. Both
+are maintained by database triggers installed in migrations, so bulk
+inserts and ``QuerySet.update()`` stay indexed. Any other backend falls
+back to DRF's ``icontains`` search.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, F, FloatField
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+from rest_framework.settings import api_settings
+
+
+SEARCH_FIELDS = ['title', 'description', 'material', 'cultural_significance']
+
+FTS_TABLE = 'products_product_fts'
+
+POSTGRES_INSTALL_SQL = [
+    'ALTER TABLE products_product ADD COLUMN IF NOT EXISTS search_vector tsvector',
+    'CREATE INDEX IF NOT EXISTS product_search_vector_idx ON products_product USING GIN (search_vector)',
+    """
+    CREATE OR REPLACE FUNCTION products_product_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.material, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C') ||
+            setweight(to_tsvector('english', coalesce(NEW.cultural_significance, '')), 'D');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    'DROP TRIGGER IF EXISTS products_product_search_vector_trigger ON products_product',
+    """
+    CREATE TRIGGER products_product_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, description, material, cultural_significance
+    ON products_product FOR EACH ROW EXECUTE FUNCTION products_product_search_vector_update()
+    """,
+    # Touch every row so the trigger fills in existing products
+    'UPDATE products_product SET title = title',
+]
+
+POSTGRES_UNINSTALL_SQL = [
+    'DROP TRIGGER IF EXISTS products_product_search_vector_trigger ON products_product',
+    'DROP FUNCTION IF EXISTS products_product_search_vector_update()',
+    'ALTER TABLE products_product DROP COLUMN IF EXISTS search_vector',
+]
+
+_columns = ', '.join(SEARCH_FIELDS)
+_new_values = ', '.join(f'new.{field}' for field in SEARCH_FIELDS)
+_old_values = ', '.join(f'old.{field}' for field in SEARCH_FIELDS)
+
+SQLITE_INSTALL_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        {_columns}, content='products_product', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON products_product BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new_values});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON products_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}) VALUES ('delete', old.id, {_old_values});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE ON products_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}) VALUES ('delete', old.id, {_old_values});
+        INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new_values});
+    END
+    """,
+    # Column weights for bm25(), in SEARCH_FIELDS order, used by the rank column
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', 'bm25(10.0, 1.0, 4.0, 0.5)')",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_UNINSTALL_SQL = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_update',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+
+def install_search_index(apps, schema_editor):
+    """Create (or recreate) the full-text index and its triggers.
+
+    SQLite drops triggers whenever a migration rebuilds ``products_product``,
+    so migrations that alter the Product table must run this again.
+    """
+    statements = {
+        'postgresql': POSTGRES_INSTALL_SQL,
+        'sqlite': SQLITE_INSTALL_SQL,
+    }.get(schema_editor.connection.vendor, [])
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def uninstall_search_index(apps, schema_editor):
+    statements = {
+        'postgresql': POSTGRES_UNINSTALL_SQL,
+        'sqlite': SQLITE_UNINSTALL_SQL,
+    }.get(schema_editor.connection.vendor, [])
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def get_tokens(terms):
+    """Reduce search terms to plain word tokens safe for MATCH / to_tsquery."""
+    return [token for term in terms for token in re.findall(r'\w+', term)]
+
+
+class PostgresSearchBackend:
+    def search(self, queryset, tokens):
+        # Prefix-match every token, like icontains would on word starts
+        query = ' & '.join(f'{token}:*' for token in tokens)
+        return queryset.filter(
+            RawSQL(
+                "products_product.search_vector @@ to_tsquery('english', %s)",
+                [query], output_field=BooleanField(),
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                "ts_rank_cd(products_product.search_vector, to_tsquery('english', %s))",
+                [query], output_field=FloatField(),
+            )
+        )
+
+
+class SQLiteSearchBackend:
+    def search(self, queryset, tokens):
+        # Joins the FTS5 table through ProductSearchIndex, so SQLite drives the
+        # query from the full-text match and looks products up by primary key
+        query = ' '.join(f'"{token}"*' for token in tokens)
+        return queryset.filter(search_index__query=query).annotate(
+            # bm25() is lower for better matches
+            search_rank=-F('search_index__rank')
+        )
+
+
+BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteSearchBackend,
+}
+
+
+def get_search_backend():
+    """Return the full-text backend for the default database, or None for icontains."""
+    name = getattr(settings, 'PRODUCT_SEARCH_BACKEND', 'auto')
+    if name == 'auto':
+        name = connection.vendor
+    backend_class = BACKENDS.get(name)
+    return backend_class() if backend_class else None
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """SearchFilter that uses the full-text index when one is available.
+
+    Results are ordered by relevance unless the request asks for an explicit
+    ``ordering``, so this backend must run after OrderingFilter.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        backend = get_search_backend()
+        if backend is None:
+            return super().filter_queryset(request, queryset, view)
+
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        tokens = get_tokens(terms)
+        if not tokens:
+            # Only punctuation: match it literally, as icontains always did
+            return super().filter_queryset(request, queryset, view)
+
+        queryset = backend.search(queryset, tokens)
+        if not request.query_params.get(api_settings.ORDERING_PARAM):
+            queryset = queryset.order_by('-search_rank', *queryset.query.order_by)
+        return queryset
+
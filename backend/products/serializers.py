@@ -1,51 +1,122 @@
+from decimal import Decimal
+
 from rest_framework import serializers
-from .models import Product, Category, Customer, Order, OrderItem
+from .models import Product, Category, Customer, Order, OrderItem, InsufficientStock
+from .analytics import record_new_order
+from .instrumentation import TimedSerializerMixin
+from .images import get_srcsets
 from django.contrib.auth.models import User
+from django.db import transaction
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     products_count = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = Category
-        fields = ["id", "name", "slug", "description", "image", "is_active", "products_count"]
+        fields = ["id", "name", "slug", "description", "image", "image_srcset", "is_active", "products_count"]
+    
+    def get_image_srcset(self, obj):
+        return get_srcsets(obj.image_derivatives.get(obj.image.name), self.context.get('request'))
     
     def get_products_count(self, obj):
+        # Prefer the count annotated by Category.objects.with_products_count()
+        count = getattr(obj, 'active_products_count', None)
+        if count is not None:
+            return count
         return obj.products.filter(is_active=True).count()
 
 
-class ProductListSerializer(serializers.ModelSerializer):
+class ProductListSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     african_style_display = serializers.CharField(source='get_african_style_display', read_only=True)
     is_in_stock = serializers.ReadOnlyField()
+    primary_image_srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = Product
         fields = [
             "id", "title", "slug", "price", "category", "category_name", 
-            "african_style", "african_style_display", "primary_image", 
+            "african_style", "african_style_display", "primary_image", "primary_image_srcset",
             "is_featured", "is_custom_order", "is_in_stock", "stock_quantity",
             "estimated_delivery_days"
         ]
+    
+    def get_primary_image_srcset(self, obj):
+        return get_srcsets(obj.image_derivatives.get(obj.primary_image.name), self.context.get('request'))
 
 
-class ProductDetailSerializer(serializers.ModelSerializer):
+class ProductListRowSerializer(TimedSerializerMixin, serializers.BaseSerializer):
+    """Serialize ``.values(*ProductViewSet.list_fields)`` rows exactly like ProductListSerializer.
+
+    List pages spend most of their time in per-field DRF machinery; this
+    builds the same dicts directly from plain rows.
+    """
+    style_labels = {value: str(label) for value, label in Product.AFRICAN_STYLES}
+    cents = Decimal('0.01')
+    
+    def to_representation(self, row):
+        request = self.context.get('request')
+        image = row['primary_image']
+        srcset = get_srcsets(row['image_derivatives'].get(image), request) if image else None
+        if image:
+            # Same URL as ImageField: storage URL, absolute when there is a request
+            image = Product._meta.get_field('primary_image').storage.url(image)
+            if request is not None:
+                image = request.build_absolute_uri(image)
+        else:
+            image = None
+        style = row['african_style']
+        return {
+            'id': row['id'],
+            'title': row['title'],
+            'slug': row['slug'],
+            'price': '{:f}'.format(row['price'].quantize(self.cents)),
+            'category': row['category'],
+            'category_name': row['category__name'],
+            'african_style': style,
+            'african_style_display': self.style_labels.get(style, style),
+            'primary_image': image,
+            'primary_image_srcset': srcset,
+            'is_featured': row['is_featured'],
+            'is_custom_order': row['is_custom_order'],
+            'is_in_stock': row['stock_quantity'] > 0 or row['is_custom_order'],
+            'stock_quantity': row['stock_quantity'],
+            'estimated_delivery_days': row['estimated_delivery_days'],
+        }
+
+
+class ProductDetailSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     african_style_display = serializers.CharField(source='get_african_style_display', read_only=True)
     is_in_stock = serializers.ReadOnlyField()
+    primary_image_srcset = serializers.SerializerMethodField()
+    image_gallery_srcsets = serializers.SerializerMethodField()
     
     class Meta:
         model = Product
-        fields = "__all__"
+        exclude = ["image_derivatives"]
+    
+    def get_primary_image_srcset(self, obj):
+        return get_srcsets(obj.image_derivatives.get(obj.primary_image.name), self.context.get('request'))
+    
+    def get_image_gallery_srcsets(self, obj):
+        # One entry per image_gallery item, None where there are no derivatives
+        request = self.context.get('request')
+        return [
+            get_srcsets(obj.image_derivatives.get(entry), request) if isinstance(entry, str) else None
+            for entry in obj.image_gallery or []
+        ]
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ["id", "username", "email", "first_name", "last_name"]
 
 
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     
     class Meta:
@@ -53,7 +124,7 @@ class CustomerSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     product_title = serializers.CharField(source='product.title', read_only=True)
     product_image = serializers.CharField(source='product.primary_image', read_only=True)
     
@@ -62,7 +133,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     customer = CustomerSerializer(read_only=True)
     items = OrderItemSerializer(many=True, read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
@@ -70,10 +141,17 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = "__all__"
+        # Status changes go through update_status (Order.change_status), which
+        # moves stock; totals are computed at checkout
+        read_only_fields = ["order_number", "status", "subtotal", "tax_amount", "shipping_cost", "total_amount"]
 
 
-class CreateOrderSerializer(serializers.ModelSerializer):
-    items = serializers.ListField(write_only=True)
+class CreateOrderSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    items = serializers.ListField(child=serializers.DictField(), write_only=True, allow_empty=False)
+    
+    TAX_RATE = Decimal('0.10')  # 10% tax
+    SHIPPING_COST = Decimal('15.00')  # Fixed shipping
+    ITEM_FIELDS = ['size', 'color', 'custom_measurements', 'custom_notes']
     
     class Meta:
         model = Order
@@ -82,31 +160,130 @@ class CreateOrderSerializer(serializers.ModelSerializer):
             "shipping_postal_code", "special_instructions", "items"
         ]
     
+    def validate_items(self, items):
+        cleaned = []
+        for item in items:
+            try:
+                product_id = int(item.get('product', item.get('product_id')))
+                quantity = int(item.get('quantity', 1))
+            except (TypeError, ValueError):
+                raise serializers.ValidationError('Each item needs a product id and an integer quantity.')
+            if quantity < 1:
+                raise serializers.ValidationError('Item quantities must be at least 1.')
+            cleaned.append({
+                'product_id': product_id,
+                'quantity': quantity,
+                **{field: item[field] for field in self.ITEM_FIELDS if field in item},
+            })
+        return cleaned
+    
     def create(self, validated_data):
         items_data = validated_data.pop('items')
         customer = self.context['request'].user.customer
         
-        # Calculate totals
-        subtotal = sum(item['unit_price'] * item['quantity'] for item in items_data)
-        tax_amount = subtotal * 0.1  # 10% tax
-        shipping_cost = 15.00  # Fixed shipping
-        total_amount = subtotal + tax_amount + shipping_cost
-        
-        order = Order.objects.create(
-            customer=customer,
-            subtotal=subtotal,
-            tax_amount=tax_amount,
-            shipping_cost=shipping_cost,
-            total_amount=total_amount,
-            **validated_data
-        )
-        
-        for item_data in items_data:
-            OrderItem.objects.create(order=order, **item_data)
+        with transaction.atomic():
+            # Prices come from the catalog, never from the client
+            product_ids = {item['product_id'] for item in items_data}
+            products = Product.objects.filter(pk__in=product_ids, is_active=True).values_list(
+                'pk', 'price', 'is_custom_order', 'category_id', 'african_style'
+            )
+            prices, custom_order_ids, attributes = {}, set(), {}
+            for product_id, price, is_custom_order, category_id, african_style in products:
+                prices[product_id] = price
+                attributes[product_id] = (category_id, african_style)
+                if is_custom_order:
+                    custom_order_ids.add(product_id)
+            missing = product_ids - prices.keys()
+            if missing:
+                raise serializers.ValidationError(
+                    {'items': [f'Unknown or unavailable products: {sorted(missing)}']}
+                )
+            
+            # Made-to-order products have no stock to reserve
+            quantities = {}
+            for item in items_data:
+                if item['product_id'] not in custom_order_ids:
+                    quantities[item['product_id']] = quantities.get(item['product_id'], 0) + item['quantity']
+            try:
+                Product.objects.reserve_stock(quantities)
+            except InsufficientStock as error:
+                raise serializers.ValidationError(
+                    {'items': [f'Product {error.product_id} does not have enough stock.']}
+                )
+            
+            items = [
+                OrderItem(
+                    unit_price=prices[item['product_id']],
+                    total_price=prices[item['product_id']] * item['quantity'],
+                    **item
+                )
+                for item in items_data
+            ]
+            
+            # Calculate totals
+            subtotal = sum(item.total_price for item in items)
+            tax_amount = (subtotal * self.TAX_RATE).quantize(Decimal('0.01'))
+            shipping_cost = self.SHIPPING_COST
+            total_amount = subtotal + tax_amount + shipping_cost
+            
+            order = Order.objects.create(
+                customer=customer,
+                subtotal=subtotal,
+                tax_amount=tax_amount,
+                shipping_cost=shipping_cost,
+                total_amount=total_amount,
+                **validated_data
+            )
+            
+            for item in items:
+                item.order = order
+            OrderItem.objects.bulk_create(items)
+            record_new_order(order, items, attributes)
         
         return order
 
 
+class AnalyticsQuerySerializer(serializers.Serializer):
+    """Query parameters of the analytics endpoints; lists are comma-separated"""
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    # Length of the default range ending today, when start is not given
+    days = serializers.IntegerField(min_value=1, max_value=3660, default=30)
+    group_by = serializers.CharField(required=False)
+    status = serializers.CharField(required=False)
+    order_by = serializers.ChoiceField(choices=['revenue', 'quantity', 'items'], default='revenue')
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=100)
+    # Sales filters
+    product = serializers.IntegerField(required=False)
+    category = serializers.IntegerField(required=False)
+    african_style = serializers.CharField(required=False)
+    size = serializers.CharField(required=False)
+    color = serializers.CharField(required=False)
+    shipping_country = serializers.CharField(required=False)
+    
+    FILTERS = ['product', 'category', 'african_style', 'size', 'color', 'shipping_country']
+    
+    def validate_group_by(self, value):
+        dimensions = [dimension for dimension in value.split(',') if dimension]
+        allowed = self.context['dimensions']
+        unknown = [dimension for dimension in dimensions if dimension not in allowed]
+        if unknown:
+            raise serializers.ValidationError(f'Unknown dimensions {unknown}; choose from {list(allowed)}.')
+        return dimensions
+    
+    def validate_status(self, value):
+        statuses = [status for status in value.split(',') if status]
+        unknown = [status for status in statuses if status not in dict(Order.STATUS_CHOICES)]
+        if unknown:
+            raise serializers.ValidationError(f'Unknown statuses {unknown}.')
+        return statuses
+    
+    def validate(self, attrs):
+        if attrs.get('start') and attrs.get('end') and attrs['start'] > attrs['end']:
+            raise serializers.ValidationError({'start': 'Must not be after end.'})
+        return attrs
+
+
 # Legacy serializer for backward compatibility
 class ProductSerializer(ProductDetailSerializer):
     pass
@@ -0,0 +1,84 @@
+from django.contrib.auth.models import User
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .analytics import record_orders, record_status_change
+from .cache import invalidate_catalog
+from .images import needs_derivatives
+from .models import Category, Customer, Order, Product, order_status_changed
+from .tasks import generate_image_derivatives, schedule_catalog_warm
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_catalog_cache(sender, **kwargs):
+    """Any product or category change (API, admin or shell) drops cached catalog responses"""
+    invalidate_catalog()
+    schedule_catalog_warm()
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_category(sender, instance, **kwargs):
+    """Note the stored category, so moving a product touches the one it leaves too"""
+    instance._previous_category_id = (
+        Product.objects.filter(pk=instance.pk).values_list('category_id', flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver([post_save, post_delete], sender=Product)
+def touch_product_category(sender, instance, **kwargs):
+    """Category payloads carry product counts, so their ETags must change with products"""
+    categories = {instance.category_id, getattr(instance, '_previous_category_id', None)} - {None}
+    Category.objects.filter(pk__in=categories).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+def schedule_image_derivatives(sender, instance, **kwargs):
+    """Resize new or changed images in a background job"""
+    if needs_derivatives(instance):
+        generate_image_derivatives.enqueue(model=instance._meta.label, pk=instance.pk, unique=True)
+
+
+@receiver(order_status_changed, sender=Order)
+def move_order_in_sales_rollups(sender, order, old_status, **kwargs):
+    """Count the order's sales under its new status, in the same transaction"""
+    record_status_change(order, old_status)
+
+
+# The lookup from Order to each model whose deletes cascade to orders
+ORDER_LOOKUPS = {Order: 'pk', Customer: 'customer', User: 'customer__user'}
+
+
+def deleted_orders(origin):
+    """The orders a delete of ``origin`` (an instance or a queryset) removes, or None if unknown"""
+    if isinstance(origin, QuerySet):
+        lookup = ORDER_LOOKUPS.get(origin.model)
+        return None if lookup is None else Order.objects.filter(**{f'{lookup}__in': origin.values('pk')})
+    lookup = ORDER_LOOKUPS.get(type(origin))
+    return None if lookup is None else Order.objects.filter(**{lookup: origin.pk})
+
+
+@receiver(pre_delete, sender=Order)
+def remove_order_from_sales_rollups(sender, instance, origin=None, **kwargs):
+    """Subtract deleted orders' sums while their items are still there.
+
+    A delete sends every pre_delete before it removes any row, so the first
+    one subtracts all the orders of the delete's origin at once and the
+    others only tick themselves off. Deletes stay a fixed number of queries
+    however many orders they remove.
+    """
+    pending = getattr(origin, '_orders_leaving_rollups', None)
+    if pending is None and (orders := deleted_orders(origin)) is not None:
+        pending = origin._orders_leaving_rollups = set(orders.values_list('pk', flat=True))
+        record_orders(orders, sign=-1)
+    if pending is None or instance.pk not in pending:
+        # Not reachable from the origin: one order at a time
+        record_orders(Order.objects.filter(pk=instance.pk), sign=-1)
+        return
+    pending.discard(instance.pk)
+    if not pending:
+        del origin._orders_leaving_rollups
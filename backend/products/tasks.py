@@ -0,0 +1,76 @@
+"""Background tasks, queued with ``<task>.enqueue(...)``; see products.jobs"""
+import logging
+from datetime import date
+from urllib.error import URLError
+from urllib.request import Request, urlopen
+
+from django.apps import apps
+from django.conf import settings
+from django.core.mail import send_mail
+
+from .analytics import refresh_days
+from .images import process_instance
+from .jobs import task
+from .models import Order
+
+
+logger = logging.getLogger(__name__)
+
+
+@task
+def generate_image_derivatives(model, pk):
+    """Bring the image derivatives of one ``app_label.Model`` object up to date"""
+    if process_instance(apps.get_model(model), pk):
+        schedule_catalog_warm()
+
+
+@task(max_attempts=1)
+def warm_catalog_cache():
+    """Request CATALOG_WARM_URLS, so the first visitors after a catalog change hit the cache"""
+    for url in settings.CATALOG_WARM_URLS:
+        try:
+            with urlopen(Request(url, headers={'Accept': 'application/json'}), timeout=30) as response:
+                response.read()
+        except (URLError, OSError) as error:
+            logger.warning('Could not warm %s: %s', url, error)
+
+
+def schedule_catalog_warm():
+    """Warm the catalog cache shortly after a change; saves in quick succession share one job"""
+    if settings.CATALOG_WARM_URLS:
+        warm_catalog_cache.enqueue(delay=settings.CATALOG_WARM_DELAY, unique=True)
+
+
+@task(max_attempts=5, retry_delay=60)
+def send_order_notification(order_id, event, status=None):
+    """Email the customer that their order was placed (``created``) or moved to ``status``"""
+    order = Order.objects.select_related('customer__user').filter(pk=order_id).first()
+    if order is None or not order.customer.user.email:
+        return
+    name = order.customer.user.first_name or order.customer.user.username
+
+    if event == 'created':
+        items = order.items.select_related('product')
+        lines = [f'- {item.product.title} x {item.quantity}: {item.total_price}' for item in items]
+        subject = f'Order {order.order_number} received'
+        body = '\n'.join([
+            f'Hello {name},',
+            '',
+            f'Thank you for your order {order.order_number}.',
+            '',
+            *lines,
+            '',
+            f'Total: {order.total_amount}',
+        ])
+    else:
+        label = dict(Order.STATUS_CHOICES).get(status, status)
+        subject = f'Order {order.order_number}: {label}'
+        body = f'Hello {name},\n\nYour order {order.order_number} is now: {label}.'
+    send_mail(subject, body, None, [order.customer.user.email])
+
+
+@task
+def refresh_sales_rollups(dates):
+    """Recompute the sales rollups of ``dates`` (ISO strings) after orders changed outside the API"""
+    for day in dates:
+        refresh_days(date.fromisoformat(day))
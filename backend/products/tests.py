@@ -0,0 +1,1140 @@
+import datetime
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from PIL import Image
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase
+
+from .analytics import day_start, inventory_report, refresh_days, sale_date
+from .datagen import generate_categories, generate_customers, generate_orders, generate_products
+from .instrumentation import RequestMetrics
+from .jobs import TASKS, run_next, task
+from . import metrics, order_numbers
+from .models import Category, Customer, DailyOrderTotals, DailyProductSales, Job, Order, OrderItem, Product
+from .order_export import filter_orders
+from .pagination import EstimatedCountPaginator
+from .renderers import FastJSONRenderer, orjson
+from .serializers import ProductListRowSerializer, ProductListSerializer
+from .tasks import generate_image_derivatives
+from .views import ProductViewSet
+
+
+def make_catalog(categories=2, products=9, prefix='a'):
+    """``categories`` categories of ``products`` products, the first of each inactive"""
+    for category_index in range(categories):
+        category = Category.objects.create(name=f'Category {prefix}{category_index}')
+        for index in range(products):
+            Product.objects.create(
+                title=f'Product {prefix}{category_index}-{index}',
+                price=Decimal('10.00') + index,
+                category=category,
+                is_active=index != 0,
+                stock_quantity=index % 3,
+                cultural_significance='Long text the list pages never load',
+            )
+
+
+# Plain HTTP test requests, whatever DEBUG says
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CatalogTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+
+class ProductListQueryTests(CatalogTestCase):
+    def test_list_query_count_does_not_grow_with_the_page(self):
+        make_catalog(categories=1)
+        # Conditional GET validators (which also give the page count), page rows
+        with self.assertNumQueries(2):
+            small = self.client.get('/api/products/').json()
+        make_catalog(categories=3, prefix='b')
+        with self.assertNumQueries(2):
+            large = self.client.get('/api/products/').json()
+        self.assertEqual((small['count'], large['count']), (8, 32))
+        self.assertEqual(len(large['results']), 20)
+
+    def test_list_rows_skip_large_text_columns(self):
+        make_catalog(categories=1)
+        with self.assertNumQueries(2) as queries:
+            data = self.client.get('/api/products/?ordering=price').json()
+        self.assertNotIn('cultural_significance', queries.captured_queries[-1]['sql'])
+        self.assertEqual(data['results'][0]['category_name'], 'Category a0')
+
+
+class CategoryListQueryTests(CatalogTestCase):
+    def test_products_count_comes_from_one_query(self):
+        make_catalog(categories=2)
+        # Validators with the row count, then the annotated page; the 304
+        # check has to run before the page is read, so this is the floor
+        with self.assertNumQueries(2):
+            small = self.client.get('/api/categories/').json()
+        make_catalog(categories=6, prefix='b')
+        cache.clear()
+        with self.assertNumQueries(2):
+            large = self.client.get('/api/categories/').json()
+        self.assertEqual(small['count'], 2)
+        self.assertEqual(large['count'], 8)
+        # Inactive products are not counted
+        self.assertEqual({category['products_count'] for category in large['results']}, {8})
+
+    def test_cached_list_only_checks_validators(self):
+        make_catalog()
+        self.client.get('/api/categories/')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/categories/').status_code, 200)
+
+
+class TopPerCategoryTests(CatalogTestCase):
+    def expected_top(self, category, limit=6):
+        products = Product.objects.filter(category=category, is_active=True).order_by('-created_at', '-id')
+        return list(products.values_list('id', flat=True)[:limit])
+
+    def test_by_category_returns_the_newest_six_per_category(self):
+        make_catalog(categories=3)
+        data = self.client.get('/api/products/by_category/').json()
+        self.assertEqual(len(data), 3)
+        for group in data:
+            category = Category.objects.get(pk=group['category']['id'])
+            self.assertEqual([product['id'] for product in group['products']], self.expected_top(category))
+            self.assertEqual(group['category']['products_count'], 8)
+
+    def test_by_category_query_count_does_not_grow_with_categories(self):
+        make_catalog(categories=2)
+        # Categories with counts, then every category's top products
+        with self.assertNumQueries(2):
+            self.client.get('/api/products/by_category/')
+        make_catalog(categories=8, prefix='b')
+        with self.assertNumQueries(2):
+            data = self.client.get('/api/products/by_category/').json()
+        self.assertEqual([len(group['products']) for group in data], [6] * 10)
+
+    def test_top_per_category_without_window_functions(self):
+        make_catalog(categories=3)
+        category = Category.objects.first()
+        with mock.patch.object(connection.features, 'supports_over_clause', False):
+            top = Product.objects.filter(is_active=True, category=category).top_per_category(6)
+            self.assertEqual(list(top.values_list('id', flat=True)), self.expected_top(category))
+
+    def test_featured_query_count_does_not_grow_with_categories(self):
+        make_catalog(categories=2)
+        Product.objects.update(is_featured=True)
+        with self.assertNumQueries(2):
+            small = self.client.get('/api/products/featured/').json()
+        make_catalog(categories=6, prefix='b')
+        Product.objects.update(is_featured=True)
+        with self.assertNumQueries(2):
+            large = self.client.get('/api/products/featured/').json()
+        self.assertEqual((len(small), len(large)), (16, 64))
+        self.assertEqual({product['category']['products_count'] for product in large}, {8})
+        created = [Product.objects.get(pk=product['id']).created_at for product in large]
+        self.assertEqual(created, sorted(created, reverse=True))
+
+
+class ProductListRowSerializerTests(CatalogTestCase):
+    def test_rows_serialize_like_product_list_serializer(self):
+        make_catalog(categories=2)
+        products = Product.objects.order_by('pk')
+        image = 'products/kente wrap #1.jpg'
+        products.filter(pk__in=products.values_list('pk', flat=True)[::3]).update(
+            primary_image=image,
+            image_derivatives={image: {'width': 800, 'height': 600, 'derivatives': [
+                {'format': 'webp', 'width': 320, 'height': 240, 'name': 'derivatives/kente wrap #1-320w.webp', 'bytes': 1},
+            ]}},
+        )
+        products.filter(pk__in=products.values_list('pk', flat=True)[::4]).update(african_style='', is_custom_order=True)
+        products.filter(pk__in=products.values_list('pk', flat=True)[::5]).update(price=Decimal('12.5'))
+        context = {'request': Request(APIRequestFactory().get('/api/products/'))}
+
+        expected = ProductListSerializer(products.select_related('category'), many=True, context=context).data
+        rows = ProductListRowSerializer(products.values(*ProductViewSet.list_fields), many=True, context=context).data
+        self.assertEqual(len(rows), 18)
+        self.assertEqual(rows, expected)
+
+
+class FilteredListTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        make_catalog(categories=3)
+        products = Product.objects.order_by('pk')
+        products.filter(title__endswith='-1').update(african_style='kente', is_custom_order=True, stock_quantity=0)
+        products.filter(title__endswith='-2').update(african_style='ankara', is_featured=True)
+
+    def get_ids(self, url):
+        ids = []
+        while url:
+            page = self.client.get(url).json()
+            ids += [product['id'] for product in page['results']]
+            url = page['next']
+        return ids
+
+    def test_filters_match_the_unindexed_results(self):
+        active = Product.objects.filter(is_active=True).order_by('-created_at', '-id')
+        category = Category.objects.order_by('pk').last()
+        cases = {
+            '': active,
+            f'category={category.pk}': active.filter(category=category),
+            'style=kente': active.filter(african_style='kente'),
+            'african_style=ankara': active.filter(african_style='ankara'),
+            'is_featured=true': active.filter(is_featured=True),
+            'min_price=12&max_price=15': active.filter(price__gte=12, price__lte=15),
+            'in_stock=true': [product for product in active if product.stock_quantity > 0 or product.is_custom_order],
+            'is_custom_order=true': active.filter(is_custom_order=True),
+        }
+        for query, expected in cases.items():
+            with self.subTest(query):
+                self.assertEqual(self.get_ids(f'/api/products/?{query}'), [product.pk for product in expected])
+
+    def test_filtered_list_query_count(self):
+        for query in ['style=kente&in_stock=true', 'min_price=12&ordering=price', 'is_featured=true&african_style=ankara']:
+            with self.subTest(query), self.assertNumQueries(2):
+                self.client.get(f'/api/products/?{query}')
+
+
+class CursorPaginationTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        make_catalog(categories=6)
+        # Plenty of ties in every ordering field, so pages split inside runs of equal values
+        products = Product.objects.order_by('pk')
+        for index, pk in enumerate(products.values_list('pk', flat=True)):
+            products.filter(pk=pk).update(
+                title=f'Title {index % 3}',
+                created_at=timezone.now() - datetime.timedelta(days=index % 4),
+            )
+
+    def walk(self, url, link):
+        pages = []
+        while url:
+            page = self.client.get(url).json()
+            pages.append([product['id'] for product in page['results']])
+            url = page[link]
+        return pages
+
+    def test_every_ordering_returns_each_row_once_in_order(self):
+        active = Product.objects.filter(is_active=True)
+        for ordering in ['', 'created_at', '-created_at', 'price', '-price', 'title', '-title']:
+            with self.subTest(ordering=ordering):
+                field = ordering or '-created_at'
+                expected = list(active.order_by(field, '-id' if field.startswith('-') else 'id').values_list('pk', flat=True))
+                pages = self.walk(f'/api/products/?pagination=cursor&ordering={ordering}', 'next')
+                self.assertEqual(len(pages), 3)
+                self.assertEqual([pk for page in pages for pk in page], expected)
+
+                # Back from the last page through the previous links
+                last = self.client.get(f'/api/products/?pagination=cursor&ordering={ordering}')
+                while last.json()['next']:
+                    last = self.client.get(last.json()['next'])
+                backwards = self.walk(last.json()['previous'], 'previous')
+                self.assertEqual(backwards, pages[-2::-1])
+
+
+class FacetTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        make_catalog(categories=3)
+        products = Product.objects.order_by('pk')
+        products.filter(title__endswith='-1').update(african_style='kente', is_custom_order=True, stock_quantity=0)
+        products.filter(title__endswith='-2').update(african_style='ankara', price=Decimal('25000'))
+
+    def count(self, query):
+        return self.client.get(f'/api/products/?{query}').json()['count']
+
+    def test_facet_counts_match_the_filtered_lists(self):
+        for base in ['', 'style=kente', 'min_price=11']:
+            with self.subTest(base), self.assertNumQueries(3):
+                facets = self.client.get(f'/api/products/facets/?{base}').json()
+            with self.subTest(base):
+                self.assertEqual(facets['total'], self.count(base))
+                for style in facets['african_style']:
+                    self.assertEqual(style['count'], self.count(f'{base}&african_style={style["value"]}'), style)
+                for category in facets['category']:
+                    self.assertEqual(category['count'], self.count(f'{base}&category={category["value"]}'), category)
+                for bucket in facets['price']:
+                    query = f'{base}&min_price={bucket["min"]}' + (f'&max_price={bucket["max"] - 0.01}' if bucket['max'] else '')
+                    self.assertEqual(bucket['count'], self.count(query), bucket)
+                availability = facets['availability']
+                self.assertEqual(availability['in_stock'], self.count(f'{base}&in_stock=true'))
+                self.assertEqual(availability['custom_order'], self.count(f'{base}&is_custom_order=true'))
+
+    def test_catalog_facets_are_cached_per_catalog_version(self):
+        facets = self.client.get('/api/products/facets/').json()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/products/facets/').json(), facets)
+        product = Product.objects.filter(is_active=True, african_style='kente').first()
+        product.is_active = False
+        product.save()
+        kente = {style['value']: style['count'] for style in self.client.get('/api/products/facets/').json()['african_style']}
+        self.assertEqual(kente['kente'], 2)
+
+
+class OrderHistoryQueryTests(CatalogTestCase):
+    def test_order_list_query_count_does_not_grow_with_orders_or_items(self):
+        make_catalog(categories=2)
+        user = User.objects.create_user('buyer', first_name='Ada', last_name='Obi')
+        customer = Customer.objects.create(user=user)
+        products = list(Product.objects.all())
+        self.client.force_authenticate(user)
+
+        def place_order(item_count):
+            order = Order.objects.create(
+                customer=customer, subtotal=1, total_amount=1, shipping_address='1 Road',
+                shipping_city='Lagos', shipping_country='Nigeria', shipping_postal_code='100001',
+            )
+            for product in products[:item_count]:
+                OrderItem.objects.create(order=order, product=product, unit_price=product.price, quantity=2)
+
+        place_order(1)
+        # Page count, orders with customer and user, items with products
+        with self.assertNumQueries(3):
+            self.client.get('/api/orders/')
+        for item_count in range(3, 15, 3):
+            place_order(item_count)
+        with self.assertNumQueries(3):
+            data = self.client.get('/api/orders/').json()
+        self.assertEqual(data['count'], 5)
+        self.assertEqual(sorted(len(order['items']) for order in data['results']), [1, 3, 6, 9, 12])
+        with self.assertNumQueries(2):
+            self.client.get(f"/api/orders/{data['results'][0]['id']}/")
+
+
+class SearchTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        category = Category.objects.create(name='Dresses')
+        self.dress = Product.objects.create(title='Royal Kente Dress', price=50, category=category)
+        self.bag = Product.objects.create(title='Bag', price=20, category=category, description='A kente bag (cotton, 100%)')
+        self.scarf = Product.objects.create(title='Scarf', price=10, category=category, cultural_significance='Dresses for kings')
+
+    def search(self, term, **params):
+        data = self.client.get('/api/products/', {'search': term, **params}).json()
+        return [product['id'] for product in data['results']]
+
+    def test_full_text_matches_ranked_by_field_weight(self):
+        self.assertEqual(self.search('kente'), [self.dress.pk, self.bag.pk])
+        self.assertEqual(self.search('dress'), [self.dress.pk, self.scarf.pk])
+        self.assertEqual(self.search('kente', ordering='price'), [self.bag.pk, self.dress.pk])
+        self.assertEqual(self.search('dress cotton'), [])
+
+    def test_punctuation_only_terms_match_literally(self):
+        self.assertEqual(self.search('%%%'), [])
+        self.assertEqual(self.search('"\'*'), [])
+        self.assertEqual(self.search('%)'), [self.bag.pk])
+
+    def test_icontains_backend(self):
+        with self.settings(PRODUCT_SEARCH_BACKEND='icontains'):
+            self.assertEqual(sorted(self.search('ente')), [self.dress.pk, self.bag.pk])
+
+
+class ConditionalGetTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        make_catalog(categories=2)
+        self.product = Product.objects.filter(is_active=True).first()
+        self.category = self.product.category
+
+    def test_matching_etag_is_answered_without_serializing(self):
+        urls = [
+            '/api/products/?ordering=price',
+            '/api/categories/',
+            f'/api/products/{self.product.pk}/',
+            f'/api/categories/{self.category.pk}/',
+        ]
+        details = urls[2:]
+        for url in urls:
+            with self.subTest(url):
+                response = self.client.get(url)
+                to_representation = 'rest_framework.serializers.ModelSerializer.to_representation'
+                with mock.patch(to_representation) as serialize, self.assertNumQueries(1):
+                    conditional = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(conditional.status_code, 304)
+                self.assertEqual(conditional['ETag'], response['ETag'])
+                serialize.assert_not_called()
+                if url in details:
+                    since = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+                    self.assertEqual(since.status_code, 304)
+
+    def test_lists_send_no_last_modified(self):
+        # Deactivating a product would not move the list's max(updated_at)
+        response = self.client.get('/api/products/')
+        self.assertNotIn('Last-Modified', response)
+        Product.objects.filter(pk=self.product.pk).update(is_active=False)
+        since = self.client.get('/api/products/', HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(since.status_code, 200)
+        self.assertEqual(since.json()['count'], response.json()['count'] - 1)
+
+    def test_product_changes_change_the_etag(self):
+        response = self.client.get('/api/categories/')
+        self.product.is_active = False
+        self.product.save()
+        self.assertEqual(self.client.get('/api/categories/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_moving_a_product_changes_both_category_etags(self):
+        other = Category.objects.exclude(pk=self.category.pk).get()
+        urls = [f'/api/categories/{self.category.pk}/', f'/api/categories/{other.pk}/']
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        self.product.category = other
+        self.product.save()
+        for url, etag in zip(urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200, url)
+        self.assertEqual(self.client.get(urls[0]).json()['products_count'], 7)
+
+
+def order_payload(*items):
+    return {
+        'shipping_address': '1 Marina Road', 'shipping_city': 'Lagos',
+        'shipping_country': 'Nigeria', 'shipping_postal_code': '100001',
+        'items': [{'product': product.pk, 'quantity': quantity} for product, quantity in items],
+    }
+
+
+class StockTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        category = Category.objects.create(name='Wraps')
+        self.product = Product.objects.create(title='Kente wrap', price=40, category=category, stock_quantity=3)
+        self.custom = Product.objects.create(title='Made to order', price=90, category=category, is_custom_order=True)
+        self.user = User.objects.create_user('buyer')
+        Customer.objects.create(user=self.user)
+        self.client.force_authenticate(self.user)
+
+    def checkout(self, quantity=2):
+        return self.client.post('/api/orders/', order_payload((self.product, quantity), (self.custom, 5)), format='json')
+
+    def assertStock(self, quantity):
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, quantity)
+
+    def test_checkout_reserves_stock_all_or_nothing(self):
+        self.assertEqual(self.checkout().status_code, 201)
+        self.assertStock(1)
+        response = self.checkout()
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('does not have enough stock', str(response.json()['items']))
+        self.assertStock(1)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_stock_moves_invalidate_the_cached_catalog(self):
+        Product.objects.filter(pk=self.product.pk).update(is_featured=True)
+
+        def featured_stock():
+            return [product['stock_quantity'] for product in self.client.get('/api/products/featured/').json()]
+
+        self.assertEqual(featured_stock(), [3])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.checkout().status_code, 201)
+        self.assertEqual(featured_stock(), [1])
+        url = f'/api/orders/{Order.objects.get().pk}/update_status/'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(url, {'status': 'cancelled'}, format='json')
+        self.assertEqual(featured_stock(), [3])
+
+    def test_cancelling_releases_and_reopening_reserves_stock(self):
+        self.checkout()
+        url = f'/api/orders/{Order.objects.get().pk}/update_status/'
+        for _ in range(2):
+            self.assertEqual(self.client.patch(url, {'status': 'cancelled'}, format='json').status_code, 200)
+            self.assertStock(3)
+        self.assertEqual(self.client.patch(url, {'status': 'confirmed'}, format='json').status_code, 200)
+        self.assertStock(1)
+        self.client.patch(url, {'status': 'cancelled'}, format='json')
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=0)
+        self.assertEqual(self.client.patch(url, {'status': 'pending'}, format='json').status_code, 409)
+        self.assertEqual(Order.objects.get().status, 'cancelled')
+
+    def test_admin_status_actions_move_stock(self):
+        self.checkout()
+        order = Order.objects.get()
+        self.client.force_login(User.objects.create_superuser('admin'))
+
+        def mark(status):
+            return self.client.post(
+                '/admin/products/order/', {'action': f'mark_{status}', '_selected_action': [order.pk]}, follow=True
+            )
+
+        change_form = self.client.get(f'/admin/products/order/{order.pk}/change/')
+        self.assertNotContains(change_form, 'name="status"')
+        self.assertContains(mark('cancelled'), '1 order(s) marked as cancelled.')
+        self.assertStock(3)
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=0)
+        self.assertContains(mark('pending'), f'Not enough stock to reopen: {order.order_number}')
+        self.assertEqual(Order.objects.get().status, 'cancelled')
+
+    def test_generic_update_cannot_change_status_or_totals(self):
+        self.checkout()
+        order = Order.objects.get()
+        response = self.client.patch(
+            f'/api/orders/{order.pk}/', {'status': 'cancelled', 'total_amount': '1.00', 'shipping_city': 'Abuja'},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        changed = Order.objects.get()
+        self.assertEqual((changed.status, changed.total_amount, changed.shipping_city), ('pending', order.total_amount, 'Abuja'))
+        self.assertStock(1)
+
+    def test_deleting_an_order_releases_its_stock(self):
+        self.checkout()
+        self.assertEqual(self.client.delete(f'/api/orders/{Order.objects.get().pk}/').status_code, 204)
+        self.assertFalse(Order.objects.exists())
+        self.assertStock(3)
+
+
+class SalesRollupTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        category = Category.objects.create(name='Wraps')
+        self.product = Product.objects.create(title='Kente wrap', price=40, category=category, stock_quantity=9)
+        self.user = User.objects.create_user('buyer')
+        Customer.objects.create(user=self.user)
+        self.client.force_authenticate(self.user)
+
+    def checkout(self, quantity):
+        response = self.client.post('/api/orders/', order_payload((self.product, quantity)), format='json')
+        self.assertEqual(response.status_code, 201)
+        return Order.objects.latest('pk')
+
+    def rollups(self):
+        """Rollup rows that count anything, without their ids"""
+        return (
+            sorted(DailyProductSales.objects.exclude(items=0).values_list(
+                'date', 'product', 'category', 'african_style', 'size', 'color', 'shipping_country', 'status',
+                'quantity', 'revenue', 'items',
+            )),
+            sorted(DailyOrderTotals.objects.exclude(orders=0).values_list(
+                'date', 'shipping_country', 'status', 'orders', 'revenue',
+            )),
+        )
+
+    def test_generic_update_and_delete_keep_rollups_consistent(self):
+        moved, cancelled, deleted = self.checkout(1), self.checkout(2), self.checkout(3)
+        url = '/api/orders/{}/'.format
+        self.client.patch(url(moved.pk), {'shipping_country': 'Ghana', 'status': 'cancelled'}, format='json')
+        self.client.patch(url(cancelled.pk) + 'update_status/', {'status': 'cancelled'}, format='json')
+        self.assertEqual(self.client.delete(url(deleted.pk)).status_code, 204)
+
+        rollups = self.rollups()
+        day = sale_date(moved.created_at)
+        self.assertEqual(rollups[1], [
+            (day, 'Ghana', 'pending', 1, Decimal('59.00')),
+            (day, 'Nigeria', 'cancelled', 1, Decimal('103.00')),
+        ])
+        refresh_days(day)
+        self.assertEqual(self.rollups(), rollups)
+
+
+    def test_bulk_and_cascading_deletes_subtract_in_a_fixed_number_of_queries(self):
+        other = User.objects.create_user('other')
+        Customer.objects.create(user=other)
+        self.client.force_authenticate(other)
+        kept = self.checkout(1)
+        self.client.force_authenticate(self.user)
+        customer = Customer.objects.get(user=self.user)
+
+        counts = []
+        for order_count in [1, 4]:
+            for _ in range(order_count):
+                self.checkout(1)
+            with CaptureQueriesContext(connection) as queries:
+                customer.orders.all().delete()
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        day = sale_date(kept.created_at)
+        self.assertEqual(self.rollups()[1], [(day, 'Nigeria', 'pending', 1, Decimal('59.00'))])
+
+        self.checkout(2)
+        self.user.delete()
+        self.assertEqual(self.rollups()[1], [(day, 'Nigeria', 'pending', 1, Decimal('59.00'))])
+        rollups = self.rollups()
+        refresh_days(day)
+        self.assertEqual(self.rollups(), rollups)
+
+class InventoryReportTests(TestCase):
+    def test_products_are_ordered_by_days_of_cover_in_one_query(self):
+        category = Category.objects.create(name='Wraps')
+        end = datetime.date(2025, 6, 30)
+        products = {}
+        for title, stock, sold, cancelled in [
+            ('slow', 50, 3, 0), ('fast', 10, 20, 0), ('unsold', 5, 0, 9), ('empty', 0, 4, 0), ('steady', 30, 15, 0),
+        ]:
+            product = products[title] = Product.objects.create(
+                title=title, price=10, category=category, stock_quantity=stock,
+            )
+            for status, quantity in [('delivered', sold), ('cancelled', cancelled)]:
+                if quantity:
+                    DailyProductSales.objects.create(
+                        date=end - datetime.timedelta(days=quantity), product=product, category=category,
+                        shipping_country='Ghana', status=status, quantity=quantity, revenue=10 * quantity, items=1,
+                    )
+        Product.objects.create(title='custom', price=10, category=category, is_custom_order=True)
+        # Outside the 30 days
+        DailyProductSales.objects.create(
+            date=end - datetime.timedelta(days=40), product=products['unsold'], category=category,
+            shipping_country='Ghana', status='delivered', quantity=7, revenue=70, items=1,
+        )
+
+        with self.assertNumQueries(1):
+            report = inventory_report(days=30, end=end, limit=4)
+        self.assertEqual(
+            [(row['title'], row['units_sold'], row['daily_units'], row['days_of_cover']) for row in report],
+            [('empty', 4, 0.13, 0.0), ('fast', 20, 0.67, 15.0), ('steady', 15, 0.5, 60.0), ('slow', 3, 0.1, 500.0)],
+        )
+        self.assertEqual(inventory_report(days=30, end=end)[-1]['days_of_cover'], None)
+
+
+class FilterOrdersTests(TestCase):
+    def test_date_range_includes_whole_days_and_uses_created_at(self):
+        customer = Customer.objects.create(user=User.objects.create_user('buyer'))
+        first, after = day_start(datetime.date(2025, 3, 10)), day_start(datetime.date(2025, 3, 13))
+        placed = {}
+        for label, moment in [
+            ('before', first - datetime.timedelta(seconds=1)), ('first', first),
+            ('last', after - datetime.timedelta(microseconds=1)), ('after', after),
+        ]:
+            order = Order.objects.create(
+                customer=customer, subtotal=10, total_amount=10, shipping_address='1 Marina Road',
+                shipping_city='Lagos', shipping_country='Nigeria', shipping_postal_code='100001',
+            )
+            Order.objects.filter(pk=order.pk).update(created_at=moment)
+            placed[order.pk] = label
+
+        orders = filter_orders(start=datetime.date(2025, 3, 10), end=datetime.date(2025, 3, 12))
+        self.assertEqual(sorted(placed[pk] for pk in orders.values_list('pk', flat=True)), ['first', 'last'])
+        # No per-row date conversion that would rule out the created_at index
+        self.assertNotIn('cast', str(orders.query).lower())
+
+
+class AdminChangeListTests(CatalogTestCase):
+    urls = ['/admin/products/product/', '/admin/products/order/', '/admin/products/customer/']
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser('admin'))
+
+    def add_orders(self, count, prefix):
+        for index in range(count):
+            customer = Customer.objects.create(user=User.objects.create_user(f'{prefix}{index}'))
+            Order.objects.create(
+                customer=customer, subtotal=10, total_amount=10, shipping_address='1 Marina Road',
+                shipping_city='Lagos', shipping_country='Nigeria', shipping_postal_code='100001',
+            )
+
+    def query_counts(self, search=''):
+        counts = []
+        for url in self.urls:
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url, {'q': search} if search else {}).status_code, 200)
+            counts.append(len(queries))
+        return counts
+
+    def test_query_counts_do_not_grow_with_the_rows(self):
+        make_catalog(categories=1, products=3)
+        self.add_orders(2, 'a')
+        # Session, user, one count (no full result count), rows, list filter choices
+        self.assertEqual(self.query_counts(), [5, 5, 5])
+        make_catalog(categories=2, products=9, prefix='b')
+        self.add_orders(12, 'b')
+        self.assertEqual(self.query_counts(), [5, 5, 5])
+        self.assertEqual(self.query_counts(search='b1'), [5, 5, 5])
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    def setUp(self):
+        make_catalog(categories=1, products=9)
+        self.products = Product.objects.order_by('pk')
+
+    def test_other_databases_count_exactly(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(EstimatedCountPaginator(self.products, 5).count, 9)
+
+    def test_postgresql_counts_up_to_the_limit_then_estimates(self):
+        with mock.patch.object(connection, 'vendor', 'postgresql'), \
+                mock.patch('products.pagination.estimate_count', return_value=12000) as estimate:
+            with self.assertNumQueries(1) as queries:
+                self.assertEqual(EstimatedCountPaginator(self.products, 5).count, 9)
+            self.assertIn('LIMIT', queries.captured_queries[0]['sql'])
+            estimate.assert_not_called()
+            with mock.patch.object(EstimatedCountPaginator, 'exact_count_limit', 4), self.assertNumQueries(1):
+                self.assertEqual(EstimatedCountPaginator(self.products, 5).count, 12000)
+            estimate.assert_called_once()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class StockStressTests(TransactionTestCase):
+    buyers = 8
+    units = 3
+
+    def test_concurrent_checkouts_never_oversell(self):
+        category = Category.objects.create(name='Limited')
+        product = Product.objects.create(title='Last units', price=25, category=category, stock_quantity=self.units)
+        users = [User.objects.create_user(f'buyer{index}') for index in range(self.buyers)]
+        for user in users:
+            Customer.objects.create(user=user)
+        start = threading.Barrier(self.buyers)
+        responses = []
+
+        def checkout(user):
+            # The test client re-raises request exceptions through a signal
+            # shared by all threads, so each thread only looks at its own responses
+            client = APIClient(raise_request_exception=False)
+            client.force_authenticate(user)
+            try:
+                start.wait()
+                for _ in range(100):
+                    response = client.post('/api/orders/', order_payload((product, 1)), format='json')
+                    if response.status_code != 500:
+                        responses.append(response)
+                        break
+                    # SQLite's shared in-memory test database: "table is locked"
+                    time.sleep(0.01)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=checkout, args=(user,)) for user in users]
+        # Retried "table is locked" errors are logged as server errors
+        with mock.patch.object(logging.getLogger('django.request'), 'disabled', True):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        statuses = sorted(response.status_code for response in responses)
+        self.assertEqual(statuses, [201] * self.units + [400] * (self.buyers - self.units))
+        for response in responses:
+            if response.status_code == 400:
+                self.assertIn('does not have enough stock', str(response.json()['items']))
+        product.refresh_from_db()
+        self.assertEqual(product.stock_quantity, 0)
+        self.assertEqual(Order.objects.count(), self.units)
+
+
+class OrderNumberTests(TestCase):
+    def test_format(self):
+        number = order_numbers.generate_order_number()
+        self.assertEqual(len(number), 20)
+        self.assertTrue(number.startswith('FC'))
+        self.assertLessEqual(set(number[2:]), set(order_numbers.ALPHABET))
+        self.assertEqual(order_numbers.format_order_number(32, 1), 'FC' + '0' * 8 + '10' + '0' * 7 + '1')
+
+    def test_numbers_strictly_increase_and_start_with_the_time(self):
+        before = order_numbers.format_order_number(time.time_ns() // 1_000_000, 0)
+        numbers = [order_numbers.generate_order_number() for _ in range(1000)]
+        self.assertEqual(numbers, sorted(set(numbers)))
+        self.assertGreaterEqual(numbers[0], before)
+        self.assertEqual(numbers[0][:12], before[:12])
+
+    @mock.patch.object(order_numbers, '_last_random', 0)
+    @mock.patch.object(order_numbers, '_last_timestamp', 0)
+    def test_same_millisecond_increments_the_random_part(self):
+        millisecond = 1_700_000_000_000
+        with mock.patch('time.time_ns', return_value=millisecond * 1_000_000):
+            first = order_numbers.generate_order_number()
+            random_part = order_numbers._last_random
+            self.assertEqual(first, order_numbers.format_order_number(millisecond, random_part))
+            self.assertEqual(order_numbers.generate_order_number(), order_numbers.format_order_number(millisecond, random_part + 1))
+            # Once the random part is exhausted, numbers move on to the next millisecond
+            order_numbers._last_random = (1 << order_numbers.RANDOM_BITS) - 1
+            self.assertEqual(order_numbers.generate_order_number(), order_numbers.format_order_number(millisecond + 1, 0))
+
+    def test_save_retries_on_collision(self):
+        customer = Customer.objects.create(user=User.objects.create_user('buyer'))
+
+        def new_order():
+            return Order(
+                customer=customer, subtotal=1, total_amount=1, shipping_address='1 Road',
+                shipping_city='Lagos', shipping_country='Nigeria', shipping_postal_code='100001',
+            )
+
+        taken = new_order()
+        taken.save()
+        fresh = order_numbers.generate_order_number()
+        with mock.patch('products.models.generate_order_number', side_effect=[taken.order_number, fresh]):
+            order = new_order()
+            order.save()
+        self.assertEqual(order.order_number, fresh)
+        with mock.patch('products.models.generate_order_number', return_value=taken.order_number) as generate:
+            with self.assertRaises(IntegrityError):
+                new_order().save()
+        self.assertEqual(generate.call_count, 3)
+        self.assertEqual(Order.objects.count(), 2)
+
+
+class ImportProductsTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Wraps', slug='wraps')
+        self.product = Product.objects.create(
+            title='Kente wrap', slug='kente-wrap', price=40, category=self.category,
+            stock_quantity=7, is_featured=True, material='Cotton',
+        )
+
+    def import_lines(self, *lines, format='jsonl'):
+        stdout, stderr = StringIO(), StringIO()
+        with mock.patch('sys.stdin', StringIO(''.join(line + '\n' for line in lines))):
+            call_command('import_products', '-', format=format, stdout=stdout, stderr=stderr)
+        return stderr.getvalue()
+
+    def test_rows_only_update_the_columns_they_provide(self):
+        self.import_lines(
+            json.dumps({'slug': 'ankara-dress', 'title': 'Ankara dress', 'price': '80', 'category': 'wraps',
+                        'stock_quantity': 4, 'is_featured': False, 'material': 'Wax print'}),
+            json.dumps({'slug': 'kente-wrap', 'title': 'Kente wrap', 'price': '45.00', 'category': 'wraps'}),
+        )
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.price, Decimal('45.00'))
+        self.assertEqual((self.product.stock_quantity, self.product.is_featured), (7, True))
+        self.assertEqual(self.product.material, 'Cotton')
+        self.assertEqual(Product.objects.get(slug='ankara-dress').stock_quantity, 4)
+
+    def test_updates_may_leave_out_required_and_blank_columns(self):
+        errors = self.import_lines(
+            'slug,title,price,category,stock_quantity,material',
+            'kente-wrap,,,,3,',
+            'new-wrap,,55,wraps,1,',
+            format='csv',
+        )
+        self.assertIn('Line 3: skipped (missing title)', errors)
+        self.product.refresh_from_db()
+        self.assertEqual(
+            (self.product.title, self.product.price, self.product.category, self.product.stock_quantity, self.product.material),
+            ('Kente wrap', Decimal('40.00'), self.category, 3, 'Cotton'),
+        )
+        self.assertFalse(Product.objects.filter(slug='new-wrap').exists())
+
+    def test_negative_stock_is_reported_per_row(self):
+        errors = self.import_lines(
+            json.dumps({'slug': 'kente-wrap', 'stock_quantity': -1}),
+            json.dumps({'slug': 'ankara-dress', 'title': 'Ankara dress', 'price': '80', 'category': 'wraps'}),
+        )
+        self.assertIn('Line 1: skipped (negative stock_quantity -1)', errors)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 7)
+        self.assertTrue(Product.objects.filter(slug='ankara-dress').exists())
+
+    def test_malformed_lines_are_reported_and_skipped(self):
+        errors = self.import_lines(
+            '{"slug": "kente-wrap", "stock_quantity": 2',
+            '[1, 2]',
+            json.dumps({'slug': 'kente-wrap', 'title': 'Kente wrap', 'price': '40', 'category': 'wraps',
+                        'is_featured': False}),
+        )
+        self.assertIn('Line 1: skipped', errors)
+        self.assertIn('Line 2: skipped (expected a JSON object)', errors)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock_quantity, self.product.is_featured), (7, False))
+
+
+class GeneratedDataTests(TestCase):
+    def generate(self):
+        """The generated rows for seed 3, rolled back afterwards"""
+        with transaction.atomic():
+            generate_products(30, generate_categories(3, seed=3), seed=3)
+            generate_orders(40, generate_customers(5, seed=3), seed=3)
+            rows = (
+                list(Product.objects.order_by('slug').values_list('slug', 'category__slug', 'price', 'created_at')),
+                list(Order.objects.order_by('order_number').values_list(
+                    'order_number', 'customer__user__username', 'created_at', 'status', 'total_amount',
+                )),
+                list(OrderItem.objects.order_by('order__order_number', 'pk').values_list(
+                    'product__slug', 'quantity', 'size', 'color', 'created_at',
+                )),
+            )
+            transaction.set_rollback(True)
+        return rows
+
+    def test_the_same_seed_generates_the_same_data(self):
+        first = self.generate()
+        self.assertEqual(len(first[1]), 40)
+        self.assertEqual(self.generate(), first)
+        # Orders only use the seed's own products, whatever else is in the catalog
+        make_catalog(categories=1, products=3)
+        self.assertEqual(self.generate()[1:], first[1:])
+
+
+class FastJSONRendererTests(TestCase):
+    data = {
+        'price': Decimal('12.50'),
+        'created_at': datetime.datetime(2025, 3, 1, 9, 30, 5, 123456, tzinfo=datetime.timezone.utc),
+        'local': timezone.make_aware(datetime.datetime(2025, 3, 1, 9, 30), datetime.timezone(datetime.timedelta(hours=1))),
+        'day': datetime.date(2025, 3, 1),
+        'time': datetime.time(9, 30, 0, 500),
+        'duration': datetime.timedelta(days=1, seconds=5),
+        'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        'label': gettext_lazy('Kente'),
+        'text': 'Àṣọ òkè – “wrap” ✨ 😀 \u2028\u2029 </script>',
+        'nested': [{'a': 1, 'b': None, 'c': True, 'd': 1.5}, (1, 2), set()],
+    }
+
+    def assertSameBytes(self, data, accepted_media_type=None, renderer_context=None):
+        expected = JSONRenderer().render(data, accepted_media_type, renderer_context)
+        self.assertEqual(FastJSONRenderer().render(data, accepted_media_type, renderer_context), expected)
+        return expected
+
+    def test_output_matches_json_renderer(self):
+        rendered = self.assertSameBytes(self.data)
+        # Like JSONEncoder: bare Decimals as numbers (DecimalFields already give strings)
+        self.assertIn(b'"price":12.5', rendered)
+        self.assertIn(b'"created_at":"2025-03-01T09:30:05.123456Z"', rendered)
+        self.assertIn(b'"local":"2025-03-01T09:30:00+01:00"', rendered)
+        self.assertIn('Àṣọ òkè'.encode(), rendered)
+        self.assertIn(b'\\u2028\\u2029', rendered)
+
+    @skipUnless(orjson, 'orjson is not installed')
+    def test_orjson_renders_without_the_stdlib_renderer(self):
+        with mock.patch.object(JSONRenderer, 'render', side_effect=AssertionError('fell back')):
+            FastJSONRenderer().render(self.data)
+
+    def test_fallbacks_match_json_renderer(self):
+        self.assertSameBytes({1: 'non-string key', 'big': 2 ** 70})
+        self.assertSameBytes(None)
+        self.assertSameBytes(self.data, 'application/json; indent=2')
+        self.assertSameBytes(self.data, renderer_context={'indent': 4})
+
+    def test_browsable_api_content_matches_json_renderer(self):
+        browsable = BrowsableAPIRenderer()
+        self.assertEqual(
+            browsable.get_content(FastJSONRenderer(), self.data, 'text/html', {}),
+            browsable.get_content(JSONRenderer(), self.data, 'text/html', {}),
+        )
+
+    @override_settings(SECURE_SSL_REDIRECT=False)
+    def test_api_responses_are_unchanged(self):
+        make_catalog(categories=1, products=3)
+        product = Product.objects.get(title='Product a0-1')
+        for url in ['/api/products/', f'/api/products/{product.pk}/', '/api/categories/']:
+            response = self.client.get(url)
+            self.assertEqual(response.content, JSONRenderer().render(response.data), url)
+        self.assertEqual(self.client.get(f'/api/products/{product.pk}/').json()['price'], '11.00')
+
+
+class ImageDerivativeTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = override_settings(
+            MEDIA_ROOT=media_root.name, IMAGE_DERIVATIVE_WIDTHS=[640, 320, 1024], JOBS_RUN_INLINE=False,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_saved_images_get_derivatives_and_srcsets(self):
+        buffer = BytesIO()
+        Image.new('RGBA', (800, 400), (200, 120, 0, 128)).save(buffer, format='PNG')
+        product = Product.objects.create(
+            title='Kente wrap', price=40, category=Category.objects.create(name='Wraps'),
+            primary_image=SimpleUploadedFile('kente.png', buffer.getvalue()),
+        )
+        job = Job.objects.get(task=generate_image_derivatives.name)
+        with self.assertLogs('products.jobs', 'INFO'):
+            self.assertTrue(run_next('worker', pk=job.pk))
+
+        product.refresh_from_db()
+        name = product.primary_image.name
+        record = product.image_derivatives[name]
+        self.assertEqual((record['width'], record['height']), (800, 400))
+        # Never wider than the original, smallest first
+        self.assertEqual(
+            [(derivative['format'], derivative['width'], derivative['height']) for derivative in record['derivatives']],
+            [('webp', 320, 160), ('jpeg', 320, 160), ('webp', 640, 320), ('jpeg', 640, 320)],
+        )
+        for derivative in record['derivatives']:
+            self.assertEqual(default_storage.size(derivative['name']), derivative['bytes'])
+            with default_storage.open(derivative['name']) as file:
+                self.assertEqual(Image.open(file).size, (derivative['width'], derivative['height']))
+
+        def srcset(extension):
+            stem = f'http://testserver/media/derivatives/{name.rsplit(".", 1)[0]}'
+            return f'{stem}-320w.{extension} 320w, {stem}-640w.{extension} 640w'
+
+        expected = {'webp': srcset('webp'), 'jpeg': srcset('jpg')}
+        self.assertEqual(self.client.get(f'/api/products/{product.pk}/').json()['primary_image_srcset'], expected)
+        self.assertEqual(self.client.get('/api/products/').json()['results'][0]['primary_image_srcset'], expected)
+        # Up to date now, so saving again schedules nothing
+        product.save()
+        self.assertFalse(Job.objects.filter(task=generate_image_derivatives.name, status='queued').exists())
+
+
+@override_settings(JOBS_RUN_INLINE=False)
+class JobTests(TestCase):
+    def test_claim_and_finish(self):
+        with mock.patch.dict(TASKS):
+            job = task(lambda: None).enqueue()
+            later = task(lambda: None).enqueue(delay=60)
+        claimed = Job.objects.claim('worker', 60)
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual((claimed.status, claimed.attempts, claimed.locked_by), ('running', 1, 'worker'))
+        # Running jobs and jobs that are not due yet stay with their owner
+        self.assertIsNone(Job.objects.claim('other-worker', 60))
+        self.assertFalse(claimed.finish('other-worker', 'done'))
+        self.assertTrue(claimed.finish('worker', 'done'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by, job.locked_until), ('done', '', None))
+        self.assertIsNotNone(job.finished_at)
+        self.assertIsNone(Job.objects.claim('worker', 60))
+
+        Job.objects.filter(pk=later.pk).update(run_at=timezone.now())
+        claimed = Job.objects.claim('worker', 60)
+        # The worker stops renewing the lock, so another one takes the job over
+        Job.objects.filter(pk=later.pk).update(locked_until=timezone.now() - datetime.timedelta(seconds=1))
+        taken_over = Job.objects.claim('other-worker', 60)
+        self.assertEqual((taken_over.pk, taken_over.attempts, taken_over.locked_by), (later.pk, 2, 'other-worker'))
+        self.assertFalse(claimed.finish('worker', 'done'))
+        self.assertTrue(taken_over.finish('other-worker', 'done'))
+
+    def test_failures_are_retried_with_backoff_then_failed(self):
+        def failing_task():
+            raise RuntimeError('Boom')
+
+        with mock.patch.dict(TASKS):
+            job = task(max_attempts=3, retry_delay=10)(failing_task).enqueue()
+            for attempt, delay in [(1, 10), (2, 20)]:
+                before = timezone.now()
+                with self.assertLogs('products.jobs', 'WARNING'):
+                    self.assertTrue(run_next('worker'))
+                job.refresh_from_db()
+                self.assertEqual((job.status, job.attempts, job.finished_at), ('queued', attempt, None))
+                self.assertIn('RuntimeError: Boom', job.last_error)
+                self.assertGreaterEqual(job.run_at, before + datetime.timedelta(seconds=delay))
+                self.assertLessEqual(job.run_at, timezone.now() + datetime.timedelta(seconds=delay))
+                # Not due until the backoff has passed
+                self.assertFalse(run_next('worker'))
+                Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+
+            with self.assertLogs('products.jobs', 'ERROR'):
+                self.assertTrue(run_next('worker'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 3))
+        self.assertIn('RuntimeError: Boom', job.last_error)
+        self.assertIsNotNone(job.finished_at)
+        self.assertFalse(run_next('worker'))
+
+
+@override_settings(JOB_TIMEOUT=1, JOBS_RUN_INLINE=False)
+class JobHeartbeatTests(TransactionTestCase):
+    def test_running_jobs_are_not_claimed_again(self):
+        claims = []
+
+        def slow_task():
+            # Outlives the 1s lock it was claimed with
+            time.sleep(1.5)
+            claims.append(Job.objects.claim('other-worker', 1))
+
+        with mock.patch.dict(TASKS):
+            job = task(slow_task).enqueue()
+            self.assertTrue(run_next('worker'))
+        job.refresh_from_db()
+        self.assertEqual(claims, [None])
+        self.assertEqual((job.status, job.attempts), ('done', 1))
+
+
+class MetricsTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(METRICS_ENABLED=True, METRICS_DIR=directory.name, METRICS_TOKEN='secret')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # A store of this test's values only
+        patcher = mock.patch.object(metrics, 'store', metrics.FileStore())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def in_other_process(self, function):
+        """Run ``function`` in a forked process, like another gunicorn worker, and flush its metrics"""
+        pid = os.fork()
+        if pid == 0:
+            try:
+                function()
+                metrics.store.flush()
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+
+    def test_values_add_up_across_processes(self):
+        def record():
+            metrics.ORDERS_CREATED.inc()
+            metrics.JOBS.inc(task='refresh', result='done')
+            metrics.REQUEST_QUERIES.observe(1, view='list')
+            metrics.REQUEST_QUERIES.observe(7, view='list')
+
+        def record_more():
+            record()
+            metrics.REQUEST_QUERIES.observe(200, view='list')
+
+        record()
+        # A forked worker starts from zero instead of counting its parent's values again
+        self.in_other_process(record_more)
+        metrics.JOBS.inc(task='a "quoted"\\task\n', result='failed')
+
+        lines = metrics.generate_latest().splitlines()
+        for line in [
+            '# HELP orders_created_total Orders created through the API.',
+            '# TYPE orders_created_total counter',
+            'orders_created_total 2',
+            'jobs_total{task="refresh",result="done"} 2',
+            'jobs_total{task="a \\"quoted\\"\\\\task\\n",result="failed"} 1',
+            '# TYPE http_request_queries histogram',
+            'http_request_queries_bucket{view="list",le="0"} 0',
+            'http_request_queries_bucket{view="list",le="1"} 2',
+            'http_request_queries_bucket{view="list",le="5"} 2',
+            'http_request_queries_bucket{view="list",le="10"} 4',
+            'http_request_queries_bucket{view="list",le="100"} 4',
+            'http_request_queries_bucket{view="list",le="+Inf"} 5',
+            'http_request_queries_sum{view="list"} 216',
+            'http_request_queries_count{view="list"} 5',
+        ]:
+            self.assertIn(line, lines)
+
+    def test_middleware_and_endpoint(self):
+        self.assertEqual(self.client.get('/api/categories/').status_code, 200)
+        self.assertEqual(self.client.get('/api/categories/404/').status_code, 404)
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        lines = response.content.decode().splitlines()
+        self.assertIn('http_requests_total{view="CategoryViewSet.list",method="GET",status="200"} 1', lines)
+        self.assertIn('http_request_errors_total{view="CategoryViewSet.retrieve",status="404"} 1', lines)
+        self.assertIn('http_request_duration_seconds_count{view="CategoryViewSet.list",method="GET"} 1', lines)
+        self.assertIn('http_request_queries_count{view="CategoryViewSet.list"} 1', lines)
+
+
+@override_settings(REQUEST_INSTRUMENTATION=True, DUPLICATE_QUERY_THRESHOLD=3)
+class RequestInstrumentationTests(CatalogTestCase):
+    def test_server_timing_and_log_line(self):
+        make_catalog(categories=1)
+        with self.assertLogs('products.instrumentation', 'INFO') as logs:
+            response = self.client.get('/api/products/')
+        self.assertRegex(response['Server-Timing'], r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="2 queries", serialize;dur=[\d.]+$')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(
+            {key: record[key] for key in ['method', 'path', 'status', 'queries', 'bytes']},
+            {'method': 'GET', 'path': '/api/products/', 'status': 200, 'queries': 2, 'bytes': len(response.content)},
+        )
+        self.assertEqual(len(logs.records), 1)
+
+    def test_repeated_statements_are_reported(self):
+        request_metrics = RequestMetrics()
+        for sql in ['SELECT 1', 'SELECT 2', 'SELECT 1', 'SELECT 1']:
+            request_metrics(lambda *args: None, sql, [], False, {})
+        self.assertEqual(request_metrics.query_count, 4)
+        self.assertEqual(request_metrics.duplicate_queries(3), [('SELECT 1', 3)])
@@ -3,40 +3,99 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Prefetch, Q
+from collections import defaultdict
 
-from .models import Product, Category, Order, Customer
+from .analytics import (
+    ORDER_DIMENSIONS, SALES_DIMENSIONS, get_date_range, inventory_report, orders_report, record_order_change,
+    sales_report
+)
+from .models import Product, Category, Order, OrderItem, Customer, InsufficientStock
 from .serializers import (
-    ProductListSerializer, ProductDetailSerializer, CategorySerializer, 
-    OrderSerializer, CreateOrderSerializer, CustomerSerializer
+    ProductListRowSerializer, ProductDetailSerializer, CategorySerializer, 
+    OrderSerializer, CreateOrderSerializer, CustomerSerializer, AnalyticsQuerySerializer
 )
-from .permissions import IsAdminOrReadOnly
+from .cache import cache_catalog_response
+from .conditional import ConditionalGetMixin, conditional_get
+from .facets import get_catalog_facets, get_facets
+from .metrics import ORDERS_CREATED
+from .pagination import ConditionalPagination, ProductPagination
+from .permissions import IsAdminOrAPIKey, IsAdminOrReadOnly
+from .search import ProductSearchFilter, SEARCH_FIELDS
+from .tasks import send_order_notification
 
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class CategoryViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """Public read-only access to categories"""
-    queryset = Category.objects.filter(is_active=True).order_by('name')
+    queryset = Category.objects.filter(is_active=True).with_products_count().order_by('name')
     serializer_class = CategorySerializer
     permission_classes = [AllowAny]
+    pagination_class = ConditionalPagination
+    
+    @conditional_get
+    @cache_catalog_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+    
+    @conditional_get
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """Public read access; require ADMIN_API_KEY for create/update/delete."""
     queryset = Product.objects.filter(is_active=True).order_by("-created_at")
     permission_classes = [IsAdminOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    pagination_class = ProductPagination
+    # ProductSearchFilter ranks results, so it runs after OrderingFilter
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, ProductSearchFilter]
     filterset_fields = ['category', 'african_style', 'is_featured', 'is_custom_order']
-    search_fields = ['title', 'description', 'material', 'cultural_significance']
+    search_fields = SEARCH_FIELDS
     ordering_fields = ['created_at', 'price', 'title']
     ordering = ['-created_at']
+    # Product payloads include category names and counts
+    conditional_timestamp_fields = ['updated_at', 'category__updated_at']
+    
+    # Columns read by ProductListRowSerializer (and cursor pagination); list
+    # pages skip the large text fields
+    list_fields = [
+        'id', 'title', 'slug', 'price', 'category', 'category__name', 'african_style',
+        'primary_image', 'image_derivatives', 'is_featured', 'is_custom_order', 'stock_quantity',
+        'estimated_delivery_days', 'created_at',
+    ]
+    
+    # Query parameters that do not change which products match
+    non_filter_params = {'ordering', 'page', 'pagination', 'cursor', 'format'}
     
     def get_serializer_class(self):
         if self.action == 'list':
-            return ProductListSerializer
+            return ProductListRowSerializer
         return ProductDetailSerializer
     
+    @conditional_get
+    def list(self, request, *args, **kwargs):
+        # Plain rows instead of model instances for ProductListRowSerializer
+        queryset = self.filter_queryset(self.get_queryset()).values(*self.list_fields)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+    
+    @conditional_get
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+    
+    def get_conditional_validators(self, request):
+        # Validators aggregate over every matching row, which cursor mode avoids
+        if self.action == 'list' and self.paginator.uses_cursor(request):
+            return None, None
+        return super().get_conditional_validators(request)
+    
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = self.optimize_queryset(super().get_queryset())
         
         # Filter by African style
         style = self.request.query_params.get('style')
@@ -60,7 +119,18 @@ class ProductViewSet(viewsets.ModelViewSet):
         
         return queryset
     
+    def optimize_queryset(self, queryset):
+        """Load exactly what the current action's serializer reads"""
+        # list and by_category select .values(*list_fields) themselves
+        if self.action in ('retrieve', 'featured'):
+            # Nested categories read their product count from an annotation
+            return queryset.prefetch_related(
+                Prefetch('category', queryset=Category.objects.with_products_count())
+            )
+        return queryset
+    
     @action(detail=False, methods=['get'])
+    @cache_catalog_response
     def featured(self, request):
         """Get featured products"""
         featured_products = self.get_queryset().filter(is_featured=True)
@@ -68,22 +138,40 @@ class ProductViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
+    @cache_catalog_response
     def african_styles(self, request):
         """Get available African styles"""
         styles = [{'value': choice[0], 'label': choice[1]} for choice in Product.AFRICAN_STYLES]
         return Response(styles)
     
     @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """Get filter counts (style, category, price, availability) for the current filters"""
+        queryset = self.filter_queryset(self.get_queryset())
+        if set(request.query_params) <= self.non_filter_params:
+            return Response(get_catalog_facets(queryset))
+        return Response(get_facets(queryset))
+    
+    @action(detail=False, methods=['get'])
+    @cache_catalog_response
     def by_category(self, request):
         """Get products grouped by category"""
-        categories = Category.objects.filter(is_active=True)
-        result = []
+        categories = list(Category.objects.filter(is_active=True).with_products_count())
+        products = (
+            self.get_queryset()
+            .filter(category__in=[category.pk for category in categories])
+            .top_per_category(6)  # Limit to 6 per category
+            .values(*self.list_fields)
+        )
+        products_by_category = defaultdict(list)
+        for product in products:
+            products_by_category[product['category']].append(product)
         
+        result = []
         for category in categories:
-            products = self.get_queryset().filter(category=category)[:6]  # Limit to 6 per category
             category_data = {
                 'category': CategorySerializer(category).data,
-                'products': ProductListSerializer(products, many=True).data
+                'products': ProductListRowSerializer(products_by_category[category.pk], many=True).data
             }
             result.append(category_data)
         
@@ -113,9 +201,38 @@ class OrderViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         if hasattr(self.request.user, 'customer'):
-            return Order.objects.filter(customer=self.request.user.customer)
+            queryset = Order.objects.filter(customer=self.request.user.customer)
+            if self.action in ('list', 'retrieve'):
+                # Nested customer, items and item products in a fixed number of queries
+                queryset = queryset.select_related('customer__user').prefetch_related(
+                    Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+                )
+            return queryset
         return Order.objects.none()
     
+    def perform_create(self, serializer):
+        # The order and its notification job commit together, so a failure
+        # never answers 500 for an order that was placed
+        with transaction.atomic():
+            super().perform_create(serializer)
+            send_order_notification.enqueue(order_id=serializer.instance.pk, event='created')
+        ORDERS_CREATED.inc()
+    
+    def perform_update(self, serializer):
+        order = serializer.instance
+        # Rollups are keyed by shipping country, so a new one moves the order's sums
+        if serializer.validated_data.get('shipping_country', order.shipping_country) == order.shipping_country:
+            return super().perform_update(serializer)
+        with record_order_change(order):
+            super().perform_update(serializer)
+    
+    def perform_destroy(self, instance):
+        # Deleting an order cancels it first, which puts its stock back; the
+        # pre_delete signal then takes it out of the rollups
+        with transaction.atomic():
+            instance.change_status('cancelled')
+            instance.delete()
+    
     @action(detail=True, methods=['patch'])
     def update_status(self, request, pk=None):
         """Update order status (admin only)"""
@@ -123,11 +240,66 @@ class OrderViewSet(viewsets.ModelViewSet):
         new_status = request.data.get('status')
         
         if new_status in dict(Order.STATUS_CHOICES):
-            order.status = new_status
-            order.save()
+            old_status = order.status
+            try:
+                # Releases stock on cancellation, reserves it again on reopening
+                order.change_status(new_status)
+            except InsufficientStock as error:
+                return Response(
+                    {'error': f'Product {error.product_id} does not have enough stock to reopen this order'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            if new_status != old_status:
+                send_order_notification.enqueue(order_id=order.pk, event='status_changed', status=new_status)
             return Response({'status': 'Order status updated'})
         
         return Response(
             {'error': 'Invalid status'}, 
             status=status.HTTP_400_BAD_REQUEST
         )
+
+
+class AnalyticsViewSet(viewsets.ViewSet):
+    """Sales and inventory reports, read from the daily rollups only (staff or X-API-KEY)"""
+    permission_classes = [IsAdminOrAPIKey]
+    
+    def get_query(self, request, dimensions):
+        serializer = AnalyticsQuerySerializer(data=request.query_params, context={'dimensions': dimensions})
+        serializer.is_valid(raise_exception=True)
+        query = serializer.validated_data
+        query['start'], query['end'] = get_date_range(query.get('start'), query.get('end'), query['days'])
+        return query
+    
+    def get_response(self, query, group_by, results):
+        for row in results:
+            # Money as strings, like the serializers' DecimalFields
+            for key in ('revenue', 'average_order_value'):
+                if key in row:
+                    row[key] = f'{row[key]:.2f}'
+        return Response({'start': query['start'], 'end': query['end'], 'group_by': group_by, 'results': results})
+    
+    @action(detail=False)
+    def sales(self, request):
+        """Units, revenue and order items by any of SALES_DIMENSIONS, e.g. ?group_by=african_style,size"""
+        query = self.get_query(request, SALES_DIMENSIONS)
+        group_by = query.get('group_by') or ['date']
+        filters = {name: query[name] for name in AnalyticsQuerySerializer.FILTERS if name in query}
+        results = sales_report(
+            group_by, query['start'], query['end'], query.get('status'), filters,
+            order_by=f"-{query['order_by']}", limit=query['limit'],
+        )
+        return self.get_response(query, group_by, results)
+    
+    @action(detail=False)
+    def orders(self, request):
+        """Orders, revenue and average order value by date, shipping_country and/or status"""
+        query = self.get_query(request, ORDER_DIMENSIONS)
+        group_by = query.get('group_by') or ['date']
+        return self.get_response(query, group_by, orders_report(group_by, query['start'], query['end'], query.get('status')))
+    
+    @action(detail=False)
+    def inventory(self, request):
+        """Stocked products by days of cover at the sales rate of the last ?days= days"""
+        query = self.get_query(request, [])
+        results = inventory_report(query['days'], query['end'], query['limit'])
+        return self.get_response(query, [], results)